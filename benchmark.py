@@ -0,0 +1,309 @@
+# Нагрузочный стенд: синтетическая база за несколько лет + замеры горячих запросов.
+#
+#   python benchmark.py --days 1095 --out results_v1.json
+#   python benchmark.py --reuse --out results_v2.json     # та же база, новая версия кода
+#
+# Результаты (JSON) можно сравнивать между версиями: одинаковые --seed и параметры
+# дают одинаковую базу.
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+PRODUCT_CATEGORIES = ("Напитки", "Снеки", "Мороженое", "Выпечка", "Призы")
+CASH_INCOME_CATEGORIES = ("Лабиринт", "Банкет", "Аренда", "Бар", "ДР")
+CASH_EXPENSE_CATEGORIES = ("Закупка", "Зарплата", "Хозрасходы", "Аренда помещения")
+EMPLOYEES = ("Анна", "Мария", "Олег", "Светлана", "Дмитрий")
+ROOMS = ("Зал 1", "Зал 2", "VIP")
+# Доли правок и удалений среди записей журнала (остальное — create), как в log_action
+LOG_UPDATE_SHARE = 0.10
+LOG_DELETE_SHARE = 0.05
+
+
+def _columns(cur, table):
+    cur.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cur.fetchall()}
+
+
+def _insert(cur, table, rows):
+    """Вставляет только те поля, которые есть в таблице (схема могла измениться)."""
+    if not rows:
+        return 0
+    cols = [c for c in rows[0] if c in _columns(cur, table)]
+    if not cols:
+        return 0
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    cur.executemany(sql, [tuple(r[c] for c in cols) for r in rows])
+    return len(rows)
+
+
+def _insert_ids(cur, table, rows):
+    """_insert, но возвращает id новых строк (генератор пишет в базу один)."""
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    last = cur.fetchone()[0]
+    return list(range(last + 1, last + 1 + _insert(cur, table, rows)))
+
+
+def _log_details(table, row, names):
+    """Поля new_values в том виде, в каком их пишет log_action приложения."""
+    if table == "stock_moves":
+        details = {"type": row["move_type"], "product": names.get(row["product_id"], "?"),
+                   "product_id": row["product_id"], "qty": row["qty"], "total": row["total"], "date": row["date"]}
+        if row["writeoff_type"]:
+            details["writeoff_type"] = row["writeoff_type"]
+        return details
+    if table == "cash_transactions":
+        return {"operation_type": row["operation_type"], "category": row["category"],
+                "amount": row["amount"], "payment_type": row["payment_type"], "date": row["date"]}
+    return {"client_name": row["client_name"], "event_date": row["event_date"], "total_price": row["total_price"]}
+
+
+def generate(db, args):
+    """Заполняет базу синтетическими данными за args.days дней до сегодняшнего."""
+    rnd = random.Random(args.seed)
+    cur = db.conn.cursor()
+    counts = {}
+
+    users = [{"username": f"user{i}", "full_name": name, "is_active": 1}
+             for i, name in enumerate(EMPLOYEES, 1)]
+    counts["users"] = _insert(cur, "users", users)
+
+    products = []
+    for i in range(1, args.products + 1):
+        cat = rnd.choice(PRODUCT_CATEGORIES)
+        products.append({"name": f"Товар {i}", "category": cat, "uom": "шт",
+                          "retail_price": rnd.choice((50, 80, 120, 150, 200, 350))})
+    counts["products"] = _insert(cur, "products", products)
+    cur.execute("SELECT id, retail_price FROM products")
+    catalog = cur.fetchall()
+    cur.execute("SELECT id, name FROM products")
+    names = dict(cur.fetchall())
+    cur.execute("SELECT id FROM users")
+    user_ids = [r[0] for r in cur.fetchall()] or [1]
+
+    start = datetime.date.today() - datetime.timedelta(days=args.days - 1)
+    for table in ("stock_moves", "cash_transactions", "bookings", "user_actions_log"):
+        counts[table] = 0
+
+    for n in range(args.days):
+        day = start + datetime.timedelta(days=n)
+        d = day.strftime("%Y-%m-%d")
+        ts = f"{d} 12:00:00"
+
+        moves = []
+        # Раз в неделю — приход по всем товарам
+        if day.weekday() == 0:
+            for pid, price in catalog:
+                moves.append(_move(d, ts, pid, rnd.randint(20, 60), "приход", price * 0.5, rnd, user_ids))
+        for _ in range(args.moves_per_day):
+            pid, price = rnd.choice(catalog)
+            r = rnd.random()
+            if r < 0.85:
+                m = _move(d, ts, pid, rnd.randint(1, 3), "продажа", price, rnd, user_ids)
+                m["payment_type"] = rnd.choice(("cash", "card"))
+            elif r < 0.93:
+                m = _move(d, ts, pid, 1, "выдача_приза", rnd.choice((10, 20, 50)), rnd, user_ids)
+            else:
+                m = _move(d, ts, pid, 1, "списание", price, rnd, user_ids)
+                m["writeoff_type"] = rnd.choice(("порча", "в счёт ЗП"))
+                m["salary_person"] = rnd.choice(EMPLOYEES) if m["writeoff_type"] == "в счёт ЗП" else None
+            moves.append(m)
+        move_ids = _insert_ids(cur, "stock_moves", moves)
+        counts["stock_moves"] += len(move_ids)
+
+        cash = []
+        for _ in range(args.cash_per_day):
+            if rnd.random() < 0.75:
+                cat = rnd.choice(CASH_INCOME_CATEGORIES)
+                desc = f"Час: {rnd.randint(0, 6)}, Безлим: {rnd.randint(0, 4)}" if cat == "Лабиринт" else "Оплата"
+                op = "income"
+            else:
+                cat, desc, op = rnd.choice(CASH_EXPENSE_CATEGORIES), "Расход", "expense"
+            cash.append({"date": d, "operation_type": op, "payment_type": rnd.choice(("cash", "card")),
+                         "category": cat, "amount": rnd.randint(3, 300) * 10, "description": desc,
+                         "user_id": rnd.choice(user_ids), "timestamp": ts})
+        cash_ids = _insert_ids(cur, "cash_transactions", cash)
+        counts["cash_transactions"] += len(cash_ids)
+
+        bookings = []
+        for _ in range(rnd.randint(0, args.bookings_per_day * 2)):
+            bookings.append({"event_date": d, "event_time": f"{rnd.randint(10, 19)}:00",
+                             "client_name": f"Клиент {rnd.randint(1, 5000)}", "room_name": rnd.choice(ROOMS),
+                             "package_name": "Стандарт", "animator_hero": "Человек-паук",
+                             "child_count": rnd.randint(5, 20), "phone": "+70000000000",
+                             "age": rnd.randint(3, 12), "total_price": rnd.randint(100, 400) * 100,
+                             "status": "done" if day < datetime.date.today() else "new"})
+        booking_ids = _insert_ids(cur, "bookings", bookings)
+        counts["bookings"] += len(booking_ids)
+
+        # Журнал — по записям этого дня, в формате log_action (create/update/delete + JSON полей)
+        events = ([("stock_moves", i, r) for i, r in zip(move_ids, moves)]
+                  + [("cash_transactions", i, r) for i, r in zip(cash_ids, cash)]
+                  + [("bookings", i, r) for i, r in zip(booking_ids, bookings)])
+        picked = rnd.sample(events, min(args.log_per_day, len(events)))
+        log = []
+        for i, (table, rid, row) in enumerate(picked):
+            details = _log_details(table, row, names)
+            r = rnd.random()
+            if r < LOG_DELETE_SHARE:
+                action, old, new = "delete", details, None
+            elif r < LOG_DELETE_SHARE + LOG_UPDATE_SHARE:
+                changed = dict(details)
+                for key in ("qty", "amount", "total_price"):
+                    if key in changed:
+                        changed[key] = changed[key] + 1
+                action, old, new = "update", details, changed
+            else:
+                action, old, new = "create", None, details
+            log.append({"user_id": row.get("user_id") or rnd.choice(user_ids), "action_type": action,
+                        "table_name": table, "record_id": rid,
+                        "old_values": json.dumps(old, ensure_ascii=False) if old else None,
+                        "new_values": json.dumps(new, ensure_ascii=False) if new else None,
+                        "timestamp": f"{d} {8 + i * 14 // max(len(picked), 1):02d}:{rnd.randint(0, 59):02d}:00"})
+        counts["user_actions_log"] += _insert(cur, "user_actions_log", log)
+
+    certs = [{"code": f"CERT{i:06d}", "amount": 3000, "balance": rnd.choice((0, 1000, 3000)),
+              "created_at": start.strftime("%Y-%m-%d")} for i in range(args.certificates)]
+    try:
+        counts["certificates"] = _insert(cur, "certificates", certs)
+    except sqlite3.Error:
+        counts["certificates"] = 0
+    db.conn.commit()
+    return counts
+
+
+def _move(d, ts, pid, qty, move_type, price, rnd, user_ids):
+    return {"date": d, "product_id": pid, "qty": qty, "move_type": move_type,
+            "unit_price": price, "total": qty * price, "employee": rnd.choice(EMPLOYEES),
+            "comment": "", "payment_type": None, "writeoff_type": None, "salary_person": None,
+            "user_id": rnd.choice(user_ids), "timestamp": ts}
+
+
+# --- ЗАМЕРЫ ---
+
+def hot_paths(db, args):
+    """[(имя, функция)] для замера. Функция может бросить AttributeError, если метода нет в этой версии."""
+    today = datetime.date.today()
+    d1 = (today - datetime.timedelta(days=30)).strftime("%Y-%m-%d")
+    d2 = today.strftime("%Y-%m-%d")
+    yesterday = (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    cur = db.conn.cursor()
+    cur.execute("SELECT id, full_name FROM users ORDER BY id LIMIT 1")
+    user = cur.fetchone() or (1, "user1")
+
+    bot = _make_bot(db)
+
+    def session_report():
+        start = datetime.datetime.now() - datetime.timedelta(hours=12)
+        return bot.build_session_report(user[0], start, user[1])
+
+    return [
+        ("calc_stock", lambda: db.calc_stock()),
+        ("fetch_sales_for_range_30d", lambda: db.fetch_sales_for_range(d1, d2)),
+        ("build_daily_report_html", lambda: db.build_daily_report_html(yesterday)),
+        ("get_security_analysis", lambda: db.get_security_analysis()),
+        ("session_report", session_report),
+        ("bot_send_period_stats_30d", lambda: bot.send_period_stats(0, 30)),
+        ("bot_send_period_stats_365d", lambda: bot.send_period_stats(0, 365)),
+        ("bot_send_detailed_report", lambda: bot.send_detailed_report(0, today - datetime.timedelta(days=1))),
+    ]
+
+
+def _make_bot(db):
+    """Бот без сети: сообщения никуда не отправляются, считаются только запросы к базе."""
+    from services.tg_bot_server import TelegramBotServer
+    from database.db_rollup import DailyRollup
+    from database.db_audit import AuditLog
+    from database.db_session import SessionAggregates
+    bot = TelegramBotServer()
+    bot.db = db
+    bot.rollup = DailyRollup(db)
+    bot.rollup.install()
+    SessionAggregates(db).install()
+    bot.audit = AuditLog(db)
+    bot.audit.install()
+    bot.audit.backfill()
+    bot.send_message = lambda *a, **kw: None
+    return bot
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"runs": repeat, "min_ms": round(min(times), 2),
+            "median_ms": round(statistics.median(times), 2), "max_ms": round(max(times), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическая база и замеры горячих запросов")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "bench_data"), help="папка для bar_uley.db")
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--moves-per-day", type=int, default=150)
+    parser.add_argument("--cash-per-day", type=int, default=20)
+    parser.add_argument("--bookings-per-day", type=int, default=3)
+    parser.add_argument("--log-per-day", type=int, default=200, help="не больше стольких записей журнала в день (по операциям дня)")
+    parser.add_argument("--certificates", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reuse", action="store_true", help="не пересоздавать базу, если она уже есть")
+    parser.add_argument("--out", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out)
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)  # DatabaseManager открывает bar_uley.db в текущей папке
+    db_file = os.path.join(args.workdir, "bar_uley.db")
+    if not args.reuse and os.path.exists(db_file):
+        os.remove(db_file)
+    fresh = not os.path.exists(db_file)
+
+    from database.db_manager import DatabaseManager
+    db = DatabaseManager()
+
+    counts = None
+    if fresh:
+        print(f"⏳ Генерация данных за {args.days} дн...")
+        t0 = time.perf_counter()
+        counts = generate(db, args)
+        print(f"✅ Готово за {time.perf_counter() - t0:.1f} с: {counts}")
+
+    results = {}
+    for name, fn in hot_paths(db, args):
+        try:
+            fn()  # прогрев (кэш страниц, ленивая установка триггеров)
+            results[name] = measure(fn, args.repeat)
+            print(f"  {name}: {results[name]['median_ms']} мс")
+        except Exception as e:
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"  {name}: пропущен ({e})")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "workdir")},
+        "env": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform()},
+        "db_size_mb": round(os.path.getsize(db_file) / 1024 / 1024, 1),
+        "rows": counts,
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📄 Результаты: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
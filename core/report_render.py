@@ -0,0 +1,32 @@
+import os
+
+
+def write_report(path, content, chunk_size=64 * 1024):
+    """
+    Записывает отчет в файл. content — строка или итерируемое строк (генератор):
+    куски пишутся по мере готовности, память не растет с размером отчета.
+    Файл появляется целиком (через временный), недописанный отчет не остается.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                buf, size = [], 0
+                for part in content:
+                    buf.append(part)
+                    size += len(part)
+                    if size >= chunk_size:
+                        f.write("".join(buf))
+                        buf, size = [], 0
+                f.write("".join(buf))
+    except BaseException:
+        # Ошибка или отмена посреди отчета — временный файл не оставляем
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,191 @@
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import types
+
+# Архивируемые таблицы: таблица -> возможные имена колонки времени (берется первая найденная)
+ARCHIVED_TABLES = {
+    "user_actions_log": ("timestamp",),
+    "login_history": ("timestamp", "login_time", "created_at"),
+}
+# Сколько последних месяцев (кроме текущего) остается в основной базе
+KEEP_MONTHS = 3
+
+
+def _months_back(day, months):
+    y, m = divmod(day.year * 12 + day.month - 1 - months, 12)
+    return datetime.date(y, m + 1, 1)
+
+
+class LogArchive:
+    """
+    Архив журналов по годам: закрытые месяцы user_actions_log/login_history переносятся
+    в отдельные файлы (archive/bar_uley_archive_<год>.db), основная база и ее бэкап
+    остаются небольшими. fetch() при запросе старого периода подключает нужные архивы
+    и объединяет результаты с основной таблицей.
+    """
+
+    def __init__(self, db, archive_dir="archive"):
+        self.db = db
+        self.archive_dir = archive_dir
+
+    def _path(self, year):
+        return os.path.join(self.archive_dir, f"bar_uley_archive_{year}.db")
+
+    def _ts_column(self, cur, table, schema="main"):
+        cur.execute(f"PRAGMA {schema}.table_info({table})")
+        cols = [row[1] for row in cur.fetchall()]
+        for name in ARCHIVED_TABLES[table]:
+            if name in cols:
+                return name, cols
+        return None, cols
+
+    def _attach(self, cur, year, alias):
+        cur.execute(f"ATTACH DATABASE ? AS {alias}", (self._path(year),))
+
+    def _prepare_archive_table(self, cur, table, alias, cols):
+        """Таблица в архиве с той же схемой; недостающие колонки (после миграций) добавляются."""
+        cur.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cur.fetchone()[0]
+        cur.execute(re.sub(r'^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?["`\[]?\w+["`\]]?',
+                           f"CREATE TABLE IF NOT EXISTS {alias}.{table}", create_sql, count=1, flags=re.IGNORECASE))
+        cur.execute(f"PRAGMA {alias}.table_info({table})")
+        arch_cols = {row[1] for row in cur.fetchall()}
+        cur.execute(f"PRAGMA main.table_info({table})")
+        types_by_col = {row[1]: row[2] for row in cur.fetchall()}
+        for col in cols:
+            if col not in arch_cols:
+                cur.execute(f"ALTER TABLE {alias}.{table} ADD COLUMN {col} {types_by_col.get(col, '')}")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_{table}_archive_ts ON {table} ({cols[0]})")
+
+    # --- ПЕРЕНОС ---
+
+    def archive(self, keep_months=KEEP_MONTHS, today=None):
+        """
+        Переносит записи старше keep_months закрытых месяцев в годовые архивы.
+        Возвращает {таблица: перенесено_строк}.
+        """
+        cutoff = _months_back(today or datetime.date.today(), keep_months).strftime("%Y-%m-%d")
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = self.db.conn
+        # ATTACH невозможен внутри транзакции, а чужие изменения не коммитим
+        if conn.in_transaction:
+            raise RuntimeError("Архивация: у соединения есть незафиксированная транзакция")
+        cur = conn.cursor()
+        moved = {}
+
+        for table in ARCHIVED_TABLES:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            if not cur.fetchone():
+                continue
+            ts, cols = self._ts_column(cur, table)
+            if not ts:
+                continue
+            cur.execute(f"SELECT DISTINCT substr({ts}, 1, 4) FROM {table} WHERE {ts} < ?", (cutoff,))
+            years = sorted(y for (y,) in cur.fetchall() if y and y.isdigit())
+            moved[table] = 0
+
+            for year in years:
+                self._attach(cur, year, "arch")
+                try:
+                    cur.execute("BEGIN IMMEDIATE")
+                    try:
+                        self._prepare_archive_table(cur, table, "arch", [ts] + [c for c in cols if c != ts])
+                        col_list = ", ".join(cols)
+                        year_cond = f"{ts} >= ? AND {ts} < ? AND {ts} < ?"
+                        params = (f"{year}-01-01", f"{int(year) + 1}-01-01", cutoff)
+                        # OR IGNORE: повторный запуск после сбоя не дублирует строки
+                        cur.execute(f"INSERT OR IGNORE INTO arch.{table} ({col_list}) "
+                                    f"SELECT {col_list} FROM main.{table} WHERE {year_cond}", params)
+                        cur.execute(f"DELETE FROM main.{table} WHERE {year_cond}", params)
+                        moved[table] += cur.rowcount
+                        cur.execute("COMMIT")
+                    except Exception:
+                        cur.execute("ROLLBACK")
+                        raise
+                finally:
+                    cur.execute("DETACH DATABASE arch")
+        return moved
+
+    # --- ЧТЕНИЕ ---
+
+    def archive_years(self):
+        if not os.path.isdir(self.archive_dir):
+            return []
+        years = []
+        for name in os.listdir(self.archive_dir):
+            if name.startswith("bar_uley_archive_") and name.endswith(".db"):
+                year = name[len("bar_uley_archive_"):-3]
+                if year.isdigit():
+                    years.append(year)
+        return sorted(years)
+
+    def fetch(self, table, columns, since=None, until=None, where="", params=(), limit=None, include_main=True):
+        """
+        Строки table за период [since, until] из основной базы и нужных архивов.
+        columns — список колонок; если в архиве колонки нет (архив старше миграции), вместо нее NULL.
+        where/params — дополнительное условие (например "user_id = ?"). Сортировка: новые сначала.
+        include_main=False — только архивы (дочитать то, чего уже нет в основной базе).
+        Внутри открытой транзакции ATTACH невозможен — тогда читается только основная база.
+        """
+        cur = self.db.conn.cursor()
+        ts, _ = self._ts_column(cur, table)
+        conds, base_params = [], []
+        if since:
+            conds.append(f"{ts} >= ?"); base_params.append(str(since))
+        if until:
+            conds.append(f"{ts} <= ?"); base_params.append(str(until))
+        if where:
+            conds.append(f"({where})"); base_params.extend(params)
+        cond_sql = f"WHERE {' AND '.join(conds)}" if conds else ""
+
+        years = [y for y in self.archive_years()
+                 if (not since or y >= str(since)[:4]) and (not until or y <= str(until)[:4])]
+        if self.db.conn.in_transaction:
+            years = []
+        attached = []
+        try:
+            for i, year in enumerate(years):
+                alias = f"arch{i}"
+                self._attach(cur, year, alias)
+                attached.append(alias)
+            parts = []
+            for schema in (["main"] if include_main else []) + attached:
+                cur.execute(f"PRAGMA {schema}.table_info({table})")
+                have = {row[1] for row in cur.fetchall()}
+                if not have:
+                    continue
+                select = ", ".join(c if c in have else f"NULL AS {c}" for c in columns)
+                parts.append(f"SELECT {select} FROM {schema}.{table} {cond_sql}")
+            if not parts:
+                return []
+            sql = " UNION ALL ".join(parts) + f" ORDER BY {ts} DESC"
+            all_params = list(base_params) * len(parts)
+            if limit:
+                sql += " LIMIT ?"
+                all_params.append(limit)
+            cur.execute(sql, all_params)
+            return cur.fetchall()
+        finally:
+            for alias in attached:
+                cur.execute(f"DETACH DATABASE {alias}")
+
+
+if __name__ == "__main__":
+    # python -m database.db_archive [--keep-months N] [--vacuum] [путь_к_бд]
+    parser = argparse.ArgumentParser(description="Перенос старых журналов в годовые архивы")
+    parser.add_argument("db_path", nargs="?", default="bar_uley.db")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS)
+    parser.add_argument("--archive-dir", default="archive")
+    parser.add_argument("--vacuum", action="store_true", help="сжать основную базу после переноса")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    result = LogArchive(types.SimpleNamespace(conn=conn), args.archive_dir).archive(args.keep_months)
+    for table, count in result.items():
+        print(f"{table}: перенесено {count}")
+    if args.vacuum:
+        conn.execute("VACUUM")
+        print("База сжата")
@@ -0,0 +1,181 @@
+import time
+
+from database.db_tx import write_transaction
+
+# Типизированные поля журнала user_actions_log: колонка -> (тип, JSON-путь(и) в old/new_values)
+AUDIT_COLUMNS = {
+    "ev_type": ("TEXT", ("$.type",)),
+    "ev_product_id": ("INTEGER", ("$.product_id",)),
+    "ev_product": ("TEXT", ("$.product", "$.name")),
+    "ev_qty": ("REAL", ("$.qty",)),
+    "ev_amount": ("REAL", ("$.total", "$.amount")),
+    "ev_category": ("TEXT", ("$.category",)),
+}
+
+# Перенос старых записей из JSON: строк за транзакцию и пауза между пачками
+# (блокировка записи держится на одну пачку, запись из других окон не ждет дольше)
+BACKFILL_BATCH = 2000
+BACKFILL_PAUSE = 0.05
+
+# Типизированные поля в строках fetch() (их читает format_log_entry бота)
+LOG_FIELDS = ("ev_type", "ev_product", "ev_qty", "ev_amount", "ev_category")
+
+AUDIT_INDEXES = (
+    ("idx_actions_log_user_ts", "user_id, timestamp"),
+    ("idx_actions_log_table_action", "table_name, action_type"),
+    ("idx_actions_log_type_ts", "ev_type, timestamp"),
+)
+
+
+def _field_sql(row, paths):
+    """Значение из new_values, а если там нет (удаление) — из old_values. Невалидный JSON -> NULL."""
+    parts = []
+    for col in ("new_values", "old_values"):
+        src = f"(CASE WHEN json_valid({row}.{col}) THEN {row}.{col} END)"
+        parts += [f"json_extract({src}, '{p}')" for p in paths]
+    return f"COALESCE({', '.join(parts)})"
+
+
+def _assign_sql(row):
+    return ",\n".join(f"{col} = {_field_sql(row, paths)}" for col, (_, paths) in AUDIT_COLUMNS.items())
+
+
+class AuditLog:
+    """
+    Ключевые поля журнала действий (тип движения, товар, кол-во, сумма, категория)
+    в типизированных колонках user_actions_log.
+    - Миграция (при открытии базы): колонки, триггер и индексы. Старые записи
+      заполняет backfill() пачками, с продолжением при следующем запуске.
+    - Новые записи заполняет триггер, так что log_action менять не нужно.
+    Фильтры и сводки по журналу работают по индексам, без json.loads на каждую строку.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def install(self):
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("PRAGMA table_info(user_actions_log)")
+            existing = {row[1] for row in cur.fetchall()}
+            missing = [col for col in AUDIT_COLUMNS if col not in existing]
+            for col in missing:
+                cur.execute(f"ALTER TABLE user_actions_log ADD COLUMN {col} {AUDIT_COLUMNS[col][0]}")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS audit_backfill (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_rowid INTEGER NOT NULL,
+                    target_rowid INTEGER NOT NULL
+                )
+            """)
+            if missing:
+                # Старые строки (до триггера) переносит backfill()
+                cur.execute("""
+                    INSERT OR REPLACE INTO audit_backfill (id, last_rowid, target_rowid)
+                    SELECT 1, 0, COALESCE(MAX(rowid), 0) FROM user_actions_log
+                """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_actions_log_fields
+                AFTER INSERT ON user_actions_log
+                WHEN json_valid(NEW.new_values) OR json_valid(NEW.old_values)
+                BEGIN
+                    UPDATE user_actions_log SET {_assign_sql('NEW')}
+                    WHERE rowid = NEW.rowid;
+                END
+            """)
+            for name, columns in AUDIT_INDEXES:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON user_actions_log ({columns})")
+
+    def backfill(self, max_seconds=None, batch=BACKFILL_BATCH):
+        """
+        Заполняет колонки старых записей из JSON пачками по batch строк, каждая —
+        своя короткая транзакция. max_seconds — остановиться по времени (продолжится
+        при следующем вызове). Возвращает True, если перенос завершен.
+        """
+        deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+        cur = self.db.conn.cursor()
+        while True:
+            cur.execute("SELECT last_rowid, target_rowid FROM audit_backfill WHERE id = 1")
+            row = cur.fetchone()
+            if not row:
+                return True
+            last, target = row
+            upto = min(last + batch, target)
+            with write_transaction(self.db.conn) as wcur:
+                wcur.execute(f"""
+                    UPDATE user_actions_log SET {_assign_sql('user_actions_log')}
+                    WHERE rowid > ? AND rowid <= ? AND (json_valid(new_values) OR json_valid(old_values))
+                """, (last, upto))
+                if upto >= target:
+                    wcur.execute("DELETE FROM audit_backfill WHERE id = 1")
+                else:
+                    wcur.execute("UPDATE audit_backfill SET last_rowid = ? WHERE id = 1", (upto,))
+            if upto >= target:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(BACKFILL_PAUSE)
+
+    # --- ЧТЕНИЕ ---
+
+    def fetch(self, user_id=None, since=None, until=None, table=None, action=None, ev_type=None, limit=100):
+        """
+        Записи журнала по фильтрам (последние сначала), в формате fetch_actions_log
+        плюс типизированные поля:
+        [(timestamp, full_name, username, action_type, table_name, record_id, old_values, new_values,
+          ev_type, ev_product, ev_qty, ev_amount, ev_category)]
+        """
+        where, params = [], []
+        for cond, value in (("l.user_id = ?", user_id), ("l.timestamp >= ?", since), ("l.timestamp <= ?", until),
+                            ("l.table_name = ?", table), ("l.action_type = ?", action), ("l.ev_type = ?", ev_type)):
+            if value is not None:
+                where.append(cond)
+                params.append(value)
+        cur = self.db.conn.cursor()
+        cur.execute(f"""
+            SELECT l.timestamp, u.full_name, u.username, l.action_type, l.table_name, l.record_id,
+                   l.old_values, l.new_values,
+                   {", ".join("l." + f for f in LOG_FIELDS)}
+            FROM user_actions_log l
+            LEFT JOIN users u ON u.id = l.user_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY l.timestamp DESC, l.id DESC
+            LIMIT ?
+        """, (*params, limit))
+        return cur.fetchall()
+
+    def fetch_archived(self, archive, user_id=None, before=None, limit=100):
+        """
+        Строки в формате fetch() из годовых архивов LogArchive — записи старше before
+        (их уже нет в основной базе). Имена сотрудников берутся из основной users.
+        """
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id = ?"); params.append(user_id)
+        if before:
+            where.append("timestamp < ?"); params.append(str(before)[:19])
+        columns = ("timestamp", "user_id", "action_type", "table_name", "record_id",
+                   "old_values", "new_values", *LOG_FIELDS)
+        rows = archive.fetch("user_actions_log", columns, until=before, where=" AND ".join(where),
+                             params=params, limit=limit, include_main=False)
+        if not rows:
+            return []
+        ids = sorted({row[1] for row in rows if row[1] is not None})
+        cur = self.db.conn.cursor()
+        cur.execute(f"SELECT id, full_name, username FROM users WHERE id IN ({','.join('?' * len(ids))})", ids)
+        names = {uid: (full_name, username) for uid, full_name, username in cur.fetchall()}
+        return [(ts, *names.get(uid, (None, None)), *rest) for ts, uid, *rest in rows]
+
+    def session_summary(self, user_id, since, until=None):
+        """
+        Сводка действий сотрудника за смену (по индексу user_id, timestamp):
+        [(table_name, action_type, ev_type, count, sum_qty, sum_amount)]
+        """
+        cur = self.db.conn.cursor()
+        cur.execute("""
+            SELECT table_name, action_type, ev_type, COUNT(*), SUM(ev_qty), SUM(ev_amount)
+            FROM user_actions_log
+            WHERE user_id = ? AND timestamp >= ? AND timestamp <= ?
+            GROUP BY table_name, action_type, ev_type
+            ORDER BY COUNT(*) DESC
+        """, (user_id, str(since)[:19], str(until or "9999-12-31")[:19]))
+        return cur.fetchall()
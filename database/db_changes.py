@@ -0,0 +1,70 @@
+from database.db_tx import write_transaction
+
+# Сколько последних изменений хранить (читатели держат свой номер и отстают ненамного)
+KEEP_CHANGES = 5000
+
+
+class ChangeFeed:
+    """
+    Лента изменений stock_moves (таблица stock_changes): триггеры пишут номер изменения,
+    затронутое движение, дату, товар и тип. Читатель помнит последний номер и получает
+    только новое — вкладки обновляют затронутые строки/даты, а не перечитывают всю историю.
+    Пишут триггеры, поэтому видно изменения из любого места программы и любого соединения.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def install(self):
+        with write_transaction(self.db.conn) as cur:
+            # AUTOINCREMENT: номер не переиспользуется после очистки старых записей
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stock_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    move_id INTEGER,
+                    date TEXT,
+                    product_id INTEGER,
+                    move_type TEXT
+                )
+            """)
+            for event, rows in (("insert", ("NEW",)), ("delete", ("OLD",)), ("update", ("OLD", "NEW"))):
+                body = "".join(
+                    f"INSERT INTO stock_changes (move_id, date, product_id, move_type) "
+                    f"VALUES ({r}.id, {r}.date, {r}.product_id, {r}.move_type);"
+                    for r in rows)
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_changes_stock_moves_{event}
+                    AFTER {event.upper()} ON stock_moves
+                    BEGIN {body} END
+                """)
+
+    def latest(self):
+        cur = self.db.conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(seq), 0) FROM stock_changes")
+        return cur.fetchone()[0]
+
+    def since(self, seq):
+        """[(seq, move_id, date, product_id, move_type)] после номера seq"""
+        cur = self.db.conn.cursor()
+        cur.execute("""
+            SELECT seq, move_id, date, product_id, move_type
+            FROM stock_changes WHERE seq > ? ORDER BY seq
+        """, (seq,))
+        return cur.fetchall()
+
+    def day_totals(self, move_type, dates):
+        """{дата: (число движений, сумма)} по датам dates — для точечного обновления меток и выручки."""
+        dates = sorted(d for d in dates if d)
+        if not dates:
+            return {}
+        cur = self.db.conn.cursor()
+        cur.execute(f"""
+            SELECT date, COUNT(*), SUM(total) FROM stock_moves
+            WHERE move_type = ? AND date IN ({",".join("?" * len(dates))})
+            GROUP BY date
+        """, (move_type, *dates))
+        return {d: (n, total) for d, n, total in cur.fetchall()}
+
+    def prune(self, keep=KEEP_CHANGES):
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("DELETE FROM stock_changes WHERE seq <= (SELECT MAX(seq) FROM stock_changes) - ?", (keep,))
@@ -0,0 +1,107 @@
+import argparse
+import sqlite3
+import sys
+
+from database.db_tx import write_transaction
+from database.db_queries import (
+    BOT_TOP_SALES_DAY, BOT_TOP_SALES_PERIOD, BOT_SALARY_WRITEOFFS, BOT_BANQUETS_DAY, BOT_BANQUETS_RANGE
+)
+from database.db_journal import JOURNAL_PAGE_SQL, JOURNAL_AFTER_SQL, MOVE_DATES_SQL
+
+# Индексы под горячие запросы отчетов.
+# Столбцы после фильтра (move_type, date) делают индекс покрывающим:
+# суммы и JOIN с products берутся из индекса, без чтения строк stock_moves.
+HOT_INDEXES = (
+    ("idx_stock_moves_type_date", "stock_moves", "move_type, date, product_id, qty, total"),
+    ("idx_stock_moves_writeoff", "stock_moves", "move_type, writeoff_type, date, salary_person, product_id, qty"),
+    ("idx_stock_moves_product", "stock_moves", "product_id, move_type, qty"),
+    # Журнал за период страницами: порядок (date, id) прямо из индекса, без сортировки
+    ("idx_stock_moves_journal", "stock_moves", "move_type, date"),
+    ("idx_cash_transactions_date", "cash_transactions", "date"),
+    ("idx_bookings_event_date", "bookings", "event_date, event_time"),
+)
+
+# Горячие запросы: имя -> (SQL, параметры). Параметры нужны только для EXPLAIN.
+# Те же константы, что выполняет код этого дерева.
+HOT_QUERIES = {
+    "bot_top_sales_day": (BOT_TOP_SALES_DAY, ("2024-01-01",)),
+    "bot_top_sales_period": (BOT_TOP_SALES_PERIOD, ("2024-01-01", "2024-01-31")),
+    "bot_salary_writeoffs": (BOT_SALARY_WRITEOFFS, ("2024-01-01",)),
+    "bot_banquets_day": (BOT_BANQUETS_DAY, ("2024-01-01",)),
+    "bot_banquets_range": (BOT_BANQUETS_RANGE, ("2024-01-01", "2024-01-14")),
+    "journal_page": (JOURNAL_PAGE_SQL.format(after=JOURNAL_AFTER_SQL),
+                     ("продажа", "2024-01-01", "2024-12-31", "2024-03-01", "2024-03-01", 100, 500)),
+    "calendar_month": (MOVE_DATES_SQL, ("продажа", "2024-03-01", "2024-03-31")),
+}
+
+# Приближения запросов миксинов DatabaseManager (их код не в этом дереве): повторяют только
+# фильтр и группировку (по ним выбирается индекс), список колонок — не тот, что у миксина.
+APPROX_QUERIES = {
+    "~sales_for_date": ("""
+        SELECT m.id, m.qty, m.total FROM stock_moves m JOIN products p ON m.product_id = p.id
+        WHERE m.move_type = 'продажа' AND m.date = ?
+    """, ("2024-01-01",)),
+    "~revenue_by_date": ("""
+        SELECT date, SUM(total) FROM stock_moves
+        WHERE move_type = 'продажа' GROUP BY date ORDER BY date DESC
+    """, ()),
+    "~dates_with_sales": ("""
+        SELECT DISTINCT date FROM stock_moves WHERE move_type = 'продажа'
+    """, ()),
+    "~product_stock": ("""
+        SELECT move_type, SUM(qty) FROM stock_moves WHERE product_id = ? GROUP BY move_type
+    """, (1,)),
+}
+
+# Справочник товаров мал, его полный проход допустим (p — псевдоним в запросах выше)
+ALLOWED_SCANS = ("products", "p")
+
+
+def ensure_indexes(conn):
+    """Создает недостающие индексы (миграция схемы, безопасно вызывать при каждом запуске)."""
+    with write_transaction(conn) as cur:
+        for name, table, columns in HOT_INDEXES:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        cur.execute("PRAGMA optimize")  # статистика для планировщика, только где она устарела
+
+
+def _full_scans(conn, sql, params):
+    """Шаги плана «SCAN <таблица>» без индекса (кроме ALLOWED_SCANS)."""
+    cur = conn.cursor()
+    cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+    bad = []
+    for row in cur.fetchall():
+        detail = row[-1]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] not in ALLOWED_SCANS and "INDEX" not in detail:
+            bad.append(detail)
+    return bad
+
+
+def check_plans(conn, queries=None):
+    """
+    EXPLAIN QUERY PLAN для горячих запросов (по умолчанию HOT_QUERIES и APPROX_QUERIES).
+    Возвращает [(имя_запроса, шаг_плана)] для запросов, которые читают таблицу целиком.
+    """
+    problems = []
+    for name, (sql, params) in (queries or {**HOT_QUERIES, **APPROX_QUERIES}).items():
+        for detail in _full_scans(conn, sql, params):
+            problems.append((name, detail))
+    return problems
+
+
+if __name__ == "__main__":
+    # python -m database.db_indexes [--no-create] [путь_к_бд]; код выхода 1 — есть полные сканы
+    parser = argparse.ArgumentParser(description="Индексы горячих запросов и проверка планов")
+    parser.add_argument("db_path", nargs="?", default="bar_uley.db")
+    parser.add_argument("--no-create", action="store_true", help="только проверить, индексы не создавать")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    if not args.no_create:
+        ensure_indexes(conn)
+    problems = check_plans(conn)
+    for name, detail in problems:
+        print(f"❌ {name}: {detail}")
+    print(f"Запросов: {len(HOT_QUERIES) + len(APPROX_QUERIES)}, с полным сканом: {len(problems)}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,47 @@
+# Страница журнала: после ключа (date, id) или с начала периода
+JOURNAL_PAGE_SQL = """
+    SELECT m.id, m.product_id, p.name, m.unit_price, m.qty, p.uom, m.total,
+           m.payment_type, m.employee, m.comment, m.date
+    FROM stock_moves m
+    LEFT JOIN products p ON p.id = m.product_id
+    WHERE m.move_type = ? AND m.date >= ? AND m.date <= ? {after}
+    ORDER BY m.date, m.id
+    LIMIT ?
+"""
+JOURNAL_AFTER_SQL = "AND (m.date > ? OR (m.date = ? AND m.id > ?))"
+
+MOVE_DATES_SQL = """
+    SELECT DISTINCT date FROM stock_moves
+    WHERE move_type = ? AND date >= ? AND date <= ?
+"""
+
+
+class MovesJournal:
+    """
+    Журнал движений (продажи/списания/приходы) страницами для ленивых таблиц.
+    Строка — в формате fetch_sales_for_range:
+    (id, product_id, name, unit_price, qty, uom, total, payment_type, employee, comment, date)
+    Страницы берутся по ключу (date, id), а не OFFSET — любая страница за период читается по индексу одинаково быстро.
+    """
+
+    def __init__(self, db, move_type, d1, d2):
+        self.db = db
+        self.move_type = move_type
+        self.d1, self.d2 = d1, d2
+
+    def fetch_page(self, after, limit):
+        """limit строк после ключа after=(date, id) (None — с начала периода)."""
+        cur = self.db.conn.cursor()
+        after_sql, params = "", [self.move_type, self.d1, self.d2]
+        if after:
+            after_sql = JOURNAL_AFTER_SQL
+            params += [after[0], after[0], after[1]]
+        cur.execute(JOURNAL_PAGE_SQL.format(after=after_sql), (*params, limit))
+        return cur.fetchall()
+
+
+def fetch_move_dates(db, move_type, d1, d2):
+    """Даты с движениями move_type в периоде [d1, d2] (для подсветки календаря по месяцам)."""
+    cur = db.conn.cursor()
+    cur.execute(MOVE_DATES_SQL, (move_type, d1, d2))
+    return [r[0] for r in cur.fetchall()]
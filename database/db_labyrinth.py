@@ -0,0 +1,66 @@
+from database.db_tx import write_transaction
+
+LAB_COLUMNS = ("lab_hour", "lab_unlim")
+
+
+def lab_count_sql(row, label):
+    """
+    Число детей из описания кассовой операции лабиринта ("Час: 3, Безлим: 2").
+    То же, что re.search(r"Час:\s*(\d+)"), но на SQL — для миграции и триггеров.
+    """
+    return (f"CASE WHEN instr(COALESCE({row}.category, ''), 'Лабиринт') > 0 "
+            f"AND instr(COALESCE({row}.description, ''), '{label}') > 0 "
+            f"THEN MAX(0, CAST(substr({row}.description, instr({row}.description, '{label}') + {len(label)}) AS INTEGER)) "
+            f"ELSE 0 END")
+
+
+class LabyrinthCounts:
+    """
+    Типизированные счетчики детей лабиринта в cash_transactions (lab_hour, lab_unlim).
+    - Разовая миграция: колонки добавляются и заполняются из старых описаний.
+    - Новые записи: если код записи не передал значения, их заполняет триггер
+      (по тем же правилам), так что аналитика делает просто SUM(lab_hour).
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def install(self):
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("PRAGMA table_info(cash_transactions)")
+            existing = {row[1] for row in cur.fetchall()}
+            missing = [col for col in LAB_COLUMNS if col not in existing]
+            for col in missing:
+                cur.execute(f"ALTER TABLE cash_transactions ADD COLUMN {col} INTEGER")
+            if missing:
+                # Разовый перенос из текстовых описаний
+                cur.execute(f"""
+                    UPDATE cash_transactions SET
+                        lab_hour = {lab_count_sql('cash_transactions', 'Час:')},
+                        lab_unlim = {lab_count_sql('cash_transactions', 'Безлим:')}
+                """)
+
+            # Запись без явных значений -> разбираем описание
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_lab_counts_insert
+                AFTER INSERT ON cash_transactions
+                WHEN NEW.lab_hour IS NULL OR NEW.lab_unlim IS NULL
+                BEGIN
+                    UPDATE cash_transactions SET
+                        lab_hour = COALESCE(NEW.lab_hour, {lab_count_sql('NEW', 'Час:')}),
+                        lab_unlim = COALESCE(NEW.lab_unlim, {lab_count_sql('NEW', 'Безлим:')})
+                    WHERE rowid = NEW.rowid;
+                END
+            """)
+            # Правка описания/категории без правки счетчиков -> пересчитываем
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_lab_counts_update
+                AFTER UPDATE OF description, category ON cash_transactions
+                WHEN NEW.lab_hour IS OLD.lab_hour AND NEW.lab_unlim IS OLD.lab_unlim
+                BEGIN
+                    UPDATE cash_transactions SET
+                        lab_hour = {lab_count_sql('NEW', 'Час:')},
+                        lab_unlim = {lab_count_sql('NEW', 'Безлим:')}
+                    WHERE rowid = NEW.rowid;
+                END
+            """)
@@ -0,0 +1,45 @@
+from database.db_audit import AuditLog
+from database.db_indexes import ensure_indexes
+from database.db_stock_balances import StockBalances
+
+# Сколько секунд за запуск переносить поля старых записей журнала (остаток — в следующий раз)
+AUDIT_BACKFILL_SECONDS = 2
+
+
+def _stock_balances(db):
+    StockBalances(db).install()
+
+
+def _indexes(db):
+    ensure_indexes(db.conn)
+
+
+def _audit_log(db):
+    audit = AuditLog(db)
+    audit.install()
+    audit.backfill(max_seconds=AUDIT_BACKFILL_SECONDS)
+
+
+# Миграции вспомогательных таблиц и триггеров: (название, функция(db)).
+# Все идемпотентны — повторный запуск только проверяет, что все на месте.
+MIGRATIONS = (
+    ("остатки stock_balances", _stock_balances),
+    ("индексы отчетов и журнала", _indexes),
+    ("поля журнала действий", _audit_log),
+)
+
+
+def migrate(db):
+    """
+    Приводит схему к текущей версии — один раз на экземпляр DatabaseManager.
+    Вызывается при открытии базы (вкладки, бот). Сбой одной миграции не мешает
+    остальным и работе программы: читатели в этом случае используют прежние запросы.
+    """
+    if getattr(db, "_schema_migrated", False):
+        return
+    db._schema_migrated = True
+    for name, step in MIGRATIONS:
+        try:
+            step(db)
+        except Exception as e:
+            print(f"⚠️ Миграция «{name}» не выполнена ({e})")
@@ -0,0 +1,47 @@
+# Запросы отчетов бота. Те же строки проверяет db_indexes.check_plans
+# (EXPLAIN QUERY PLAN), поэтому правка запроса здесь сразу попадает под проверку.
+
+# Топ-10 продаж бара за день: (категория, товар, кол-во, сумма, чеков)
+BOT_TOP_SALES_DAY = """
+    SELECT p.category, p.name, SUM(m.qty), SUM(m.total), COUNT(*)
+    FROM stock_moves m
+    JOIN products p ON m.product_id = p.id
+    WHERE m.move_type = 'продажа' AND m.date = ?
+    GROUP BY p.category, p.name
+    ORDER BY SUM(m.total) DESC
+    LIMIT 10
+"""
+
+# Топ-5 продаж за период: (товар, сумма, кол-во)
+BOT_TOP_SALES_PERIOD = """
+    SELECT p.name, SUM(m.total), SUM(m.qty)
+    FROM stock_moves m
+    JOIN products p ON m.product_id = p.id
+    WHERE m.move_type = 'продажа' AND m.date >= ? AND m.date <= ?
+    GROUP BY p.name
+    ORDER BY SUM(m.total) DESC
+    LIMIT 5
+"""
+
+# Списания в счет ЗП за день: (сотрудник, сумма по рознице, позиций)
+BOT_SALARY_WRITEOFFS = """
+    SELECT m.salary_person, SUM(m.qty * p.retail_price), COUNT(*)
+    FROM stock_moves m
+    JOIN products p ON m.product_id = p.id
+    WHERE m.move_type = 'списание' AND m.writeoff_type = 'в счёт ЗП' AND m.date = ?
+    GROUP BY m.salary_person
+"""
+
+# Банкеты дня
+BOT_BANQUETS_DAY = """
+    SELECT client_name, event_time, room_name, child_count FROM bookings WHERE event_date = ? ORDER BY event_time
+"""
+
+# Праздники за период (ближайшие ДР)
+BOT_BANQUETS_RANGE = """
+    SELECT event_date, event_time, client_name, room_name, package_name,
+           animator_hero, child_count, phone, age, total_price, status
+    FROM bookings
+    WHERE event_date >= ? AND event_date <= ?
+    ORDER BY event_date, event_time
+"""
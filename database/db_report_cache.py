@@ -0,0 +1,158 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+
+from database.db_versions import DataVersions
+from database.db_tx import write_transaction
+
+# Таблицы с версиями по датам: таблица -> колонка даты
+DATED_TABLES = {
+    "stock_moves": "date",
+    "cash_transactions": "date",
+    "bookings": "event_date",
+}
+# Остальные таблицы базы (оплаты банкетов, сертификаты, товары, пользователи, рецепты...)
+# ведут общий счетчик DataVersions: любая запись в них меняет ключ всех отчетов.
+# Исключены только служебные: журналы (пишутся при каждом действии, в том числе при
+# открытии отчета) и производные от stock_moves/cash_transactions кэши и агрегаты.
+UNVERSIONED_TABLES = {
+    "date_versions", "data_versions", "stock_changes", "table_counters",
+    "daily_rollup", "daily_cash_rollup", "stock_balances", "audit_backfill",
+    "user_actions_log", "login_history",
+}
+# При изменении формата отчетов версия увеличивается -> старый кэш не используется
+CACHE_FORMAT = 1
+CACHE_DIR = os.path.join("reports", ".cache")
+CACHE_MAX_FILES = 500
+
+
+def _bump_sql(row, col):
+    return f"""
+        INSERT INTO date_versions (date, version) VALUES ({row}.{col}, 1)
+        ON CONFLICT (date) DO UPDATE SET version = version + 1;
+    """
+
+
+class ReportCache:
+    """
+    Кэш готовых HTML-отчетов.
+    Ключ — вид отчета + параметры + «отпечаток» данных за период: версии дат из
+    date_versions (их увеличивают триггеры при любой записи, затрагивающей дату)
+    и общие версии остальных таблиц (data_versions). Отчет за закрытый день, который
+    никто не правил, отдается готовым файлом; пересчитываются только дни, где были изменения.
+    """
+
+    def __init__(self, db, cache_dir=CACHE_DIR):
+        self.db = db
+        self.cache_dir = cache_dir
+
+    def install(self):
+        """Таблица версий по датам и триггеры (нужно соединение с правом записи)."""
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS date_versions (
+                    date TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            for table, col in DATED_TABLES.items():
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_datever_{table}_insert AFTER INSERT ON {table}
+                    WHEN NEW.{col} IS NOT NULL
+                    BEGIN {_bump_sql('NEW', col)} END
+                """)
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_datever_{table}_delete AFTER DELETE ON {table}
+                    WHEN OLD.{col} IS NOT NULL
+                    BEGIN {_bump_sql('OLD', col)} END
+                """)
+                # Правка может перенести запись на другую дату -> меняются обе
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_datever_{table}_update AFTER UPDATE ON {table}
+                    BEGIN
+                        INSERT INTO date_versions (date, version) SELECT OLD.{col}, 1 WHERE OLD.{col} IS NOT NULL
+                        ON CONFLICT (date) DO UPDATE SET version = version + 1;
+                        INSERT INTO date_versions (date, version) SELECT NEW.{col}, 1
+                        WHERE NEW.{col} IS NOT NULL AND NEW.{col} IS NOT OLD.{col}
+                        ON CONFLICT (date) DO UPDATE SET version = version + 1;
+                    END
+                """)
+        versions = DataVersions(self.db)
+        for table in self._global_tables(self.db.conn.cursor()):
+            versions.watch(table)
+
+    @staticmethod
+    def _global_tables(cur):
+        """Таблицы базы с общим счетчиком версий (все, кроме DATED_TABLES и UNVERSIONED_TABLES)."""
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [name for (name,) in cur.fetchall() if name not in DATED_TABLES and name not in UNVERSIONED_TABLES]
+
+    def _ready(self, cur):
+        cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_datever_%'")
+        return cur.fetchone()[0] == 3 * len(DATED_TABLES)
+
+    def _global_versions(self, cur):
+        """[(таблица, версия)] по всем таблицам без версий дат; None — если какая-то не отслеживается."""
+        tables = self._global_tables(cur)
+        if not tables:
+            return []
+        try:
+            cur.execute(f"SELECT name, version FROM data_versions WHERE name IN ({','.join('?' * len(tables))}) "
+                        f"ORDER BY name", tables)
+        except sqlite3.Error:
+            return None
+        rows = cur.fetchall()
+        return rows if len(rows) == len(tables) else None
+
+    def key(self, kind, params, d1, d2):
+        """Ключ кэша или None, если кэш неприменим (период захватывает сегодня, версии дат не ведутся)."""
+        # Текущий день еще меняется (в том числе производные таблицы из UNVERSIONED_TABLES)
+        if str(d2) >= datetime.date.today().strftime("%Y-%m-%d"):
+            return None
+        cur = self.db.conn.cursor()
+        if not self._ready(cur):
+            return None
+        # Версии только растут, поэтому сумма по периоду меняется при любой записи в нем
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(version), 0) FROM date_versions WHERE date >= ? AND date <= ?",
+                    (str(d1), str(d2)))
+        count, total = cur.fetchone()
+        # Новая таблица без счетчика (появилась после install) — кэш не используем
+        versions = self._global_versions(cur)
+        if versions is None:
+            return None
+        raw = json.dumps([CACHE_FORMAT, kind, params, str(d1), str(d2), count, total, versions],
+                         ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.html")
+
+    def fetch(self, key, out_path):
+        """Копирует готовый отчет в out_path. True — если он был в кэше."""
+        if not key or not os.path.exists(self._path(key)):
+            return False
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        shutil.copyfile(self._path(key), out_path)
+        os.utime(self._path(key))  # для вытеснения давно не открывавшихся
+        return True
+
+    def store(self, key, report_path):
+        if not key:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shutil.copyfile(report_path, self._path(key))
+        self._prune()
+
+    def _prune(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".html")]
+        if len(files) <= CACHE_MAX_FILES:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - CACHE_MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
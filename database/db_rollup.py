@@ -0,0 +1,239 @@
+from database.db_labyrinth import LabyrinthCounts, lab_count_sql
+from database.db_tx import write_transaction
+
+# Версия схемы триггеров: при смене формулы старые триггеры удаляются,
+# а агрегаты пересчитываются из истории.
+ROLLUP_SCHEMA = 3
+TRIGGER_PREFIX = f"trg_rollup{ROLLUP_SCHEMA}_"
+
+
+def _cash_apply_sql(row, sign):
+    """Тело триггера: добавить (sign='+') или вычесть (sign='-') кассовую операцию row (NEW/OLD)."""
+    return f"""
+        INSERT INTO daily_cash_rollup (date, op_type, payment_type, category)
+        VALUES (COALESCE({row}.date, ''), COALESCE({row}.operation_type, ''), COALESCE({row}.payment_type, ''), COALESCE({row}.category, ''))
+        ON CONFLICT (date, op_type, payment_type, category) DO NOTHING;
+        UPDATE daily_cash_rollup SET
+            amount = amount {sign} COALESCE({row}.amount, 0),
+            tx_count = tx_count {sign} 1,
+            lab_hour = lab_hour {sign} COALESCE({row}.lab_hour, 0),
+            lab_unlim = lab_unlim {sign} COALESCE({row}.lab_unlim, 0)
+        WHERE date = COALESCE({row}.date, '') AND op_type = COALESCE({row}.operation_type, '')
+          AND payment_type = COALESCE({row}.payment_type, '') AND category = COALESCE({row}.category, '');
+    """
+
+
+def _moves_apply_sql(row, sign):
+    """Тело триггера для stock_moves: продажи бара и выдача призов."""
+    return f"""
+        INSERT INTO daily_rollup (date) VALUES ({row}.date) ON CONFLICT (date) DO NOTHING;
+        UPDATE daily_rollup SET
+            bar_total = bar_total {sign} (CASE WHEN {row}.move_type = 'продажа' THEN COALESCE({row}.total, 0) ELSE 0 END),
+            bar_count = bar_count {sign} (CASE WHEN {row}.move_type = 'продажа' THEN 1 ELSE 0 END),
+            prizes_qty = prizes_qty {sign} (CASE WHEN {row}.move_type = 'выдача_приза' THEN COALESCE({row}.qty, 0) ELSE 0 END),
+            prizes_tickets = prizes_tickets {sign} (CASE WHEN {row}.move_type = 'выдача_приза' THEN COALESCE({row}.total, 0) ELSE 0 END)
+        WHERE date = {row}.date;
+    """
+
+
+def _bookings_apply_sql(row, sign):
+    return f"""
+        INSERT INTO daily_rollup (date) VALUES ({row}.event_date) ON CONFLICT (date) DO NOTHING;
+        UPDATE daily_rollup SET
+            banquets_count = banquets_count {sign} 1,
+            banquets_revenue = banquets_revenue {sign} COALESCE({row}.total_price, 0),
+            banquets_children = banquets_children {sign} COALESCE({row}.child_count, 0)
+        WHERE date = {row}.event_date;
+    """
+
+
+# (таблица, генератор тела триггера, условие WHEN: какие строки учитываются)
+_SOURCES = (
+    ("cash_transactions", _cash_apply_sql, None),
+    ("stock_moves", _moves_apply_sql, "{row}.move_type IN ('продажа', 'выдача_приза')"),
+    ("bookings", _bookings_apply_sql, None),
+)
+
+
+class DailyRollup:
+    """
+    Дневные агрегаты для отчетов бота (таблицы daily_rollup и daily_cash_rollup).
+    Обновляются триггерами при каждой записи в cash_transactions, stock_moves и bookings,
+    поэтому статистика за 7/30/365 дней — это несколько чтений по диапазону дат,
+    а не перебор всех операций с разбором описаний в Python.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.installed = False
+
+    def install(self):
+        """Создает таблицы и триггеры; при первом запуске заполняет агрегаты из истории."""
+        # Счетчики детей лабиринта хранятся в cash_transactions типизированно
+        LabyrinthCounts(self.db).install()
+
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollup'")
+            is_new = cur.fetchone() is None
+            # Триггеры прежней версии схемы -> удалить и пересчитать агрегаты
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_rollup%'")
+            stale = [name for (name,) in cur.fetchall() if not name.startswith(TRIGGER_PREFIX)]
+            for name in stale:
+                cur.execute(f"DROP TRIGGER {name}")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS daily_rollup (
+                    date TEXT PRIMARY KEY,
+                    bar_total REAL NOT NULL DEFAULT 0,
+                    bar_count INTEGER NOT NULL DEFAULT 0,
+                    prizes_qty REAL NOT NULL DEFAULT 0,
+                    prizes_tickets REAL NOT NULL DEFAULT 0,
+                    banquets_count INTEGER NOT NULL DEFAULT 0,
+                    banquets_revenue REAL NOT NULL DEFAULT 0,
+                    banquets_children INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS daily_cash_rollup (
+                    date TEXT NOT NULL,
+                    op_type TEXT NOT NULL,
+                    payment_type TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    amount REAL NOT NULL DEFAULT 0,
+                    tx_count INTEGER NOT NULL DEFAULT 0,
+                    lab_hour INTEGER NOT NULL DEFAULT 0,
+                    lab_unlim INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (date, op_type, payment_type, category)
+                )
+            """)
+            self._create_triggers(cur)
+            if is_new or stale:
+                cur.execute("DELETE FROM daily_cash_rollup")
+                cur.execute("DELETE FROM daily_rollup")
+                self._fill(cur)
+        self.installed = True
+
+    def _create_triggers(self, cur, replace=False):
+        for table, body, cond in _SOURCES:
+            if replace:
+                for event in ("insert", "delete", "update", "update_old", "update_new"):
+                    cur.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}{table}_{event}")
+            when_new = f"WHEN {cond.format(row='NEW')}" if cond else ""
+            when_old = f"WHEN {cond.format(row='OLD')}" if cond else ""
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}{table}_insert AFTER INSERT ON {table} {when_new}
+                BEGIN {body('NEW', '+')} END
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}{table}_delete AFTER DELETE ON {table} {when_old}
+                BEGIN {body('OLD', '-')} END
+            """)
+            # UPDATE = вычесть старую версию строки и добавить новую
+            if cond:
+                # Каждая половина — только для учитываемой строки, чтобы правка
+                # прочих движений не создавала пустых строк агрегатов
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}{table}_update_old AFTER UPDATE ON {table} {when_old}
+                    BEGIN {body('OLD', '-')} END
+                """)
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}{table}_update_new AFTER UPDATE ON {table} {when_new}
+                    BEGIN {body('NEW', '+')} END
+                """)
+            else:
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}{table}_update AFTER UPDATE ON {table}
+                    BEGIN {body('OLD', '-')} {body('NEW', '+')} END
+                """)
+
+    def _fill(self, cur):
+        cur.execute("""
+            INSERT INTO daily_cash_rollup (date, op_type, payment_type, category, amount, tx_count, lab_hour, lab_unlim)
+            SELECT COALESCE(date, ''), COALESCE(operation_type, ''), COALESCE(payment_type, ''), COALESCE(category, ''),
+                   SUM(COALESCE(amount, 0)), COUNT(*),
+                   SUM(COALESCE(lab_hour, 0)), SUM(COALESCE(lab_unlim, 0))
+            FROM cash_transactions
+            GROUP BY 1, 2, 3, 4
+        """)
+        cur.execute("""
+            INSERT INTO daily_rollup (date, bar_total, bar_count, prizes_qty, prizes_tickets)
+            SELECT date,
+                   SUM(CASE WHEN move_type = 'продажа' THEN COALESCE(total, 0) ELSE 0 END),
+                   SUM(move_type = 'продажа'),
+                   SUM(CASE WHEN move_type = 'выдача_приза' THEN COALESCE(qty, 0) ELSE 0 END),
+                   SUM(CASE WHEN move_type = 'выдача_приза' THEN COALESCE(total, 0) ELSE 0 END)
+            FROM stock_moves
+            WHERE move_type IN ('продажа', 'выдача_приза')
+            GROUP BY date
+        """)
+        cur.execute("""
+            INSERT INTO daily_rollup (date, banquets_count, banquets_revenue, banquets_children)
+            SELECT event_date, COUNT(*), SUM(COALESCE(total_price, 0)), SUM(COALESCE(child_count, 0))
+            FROM bookings
+            GROUP BY event_date
+            ON CONFLICT (date) DO UPDATE SET
+                banquets_count = excluded.banquets_count,
+                banquets_revenue = excluded.banquets_revenue,
+                banquets_children = excluded.banquets_children
+        """)
+
+    def rebuild(self):
+        """Полный пересчет агрегатов из исходных таблиц (и пересоздание триггеров)."""
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("DELETE FROM daily_cash_rollup")
+            cur.execute("DELETE FROM daily_rollup")
+            self._create_triggers(cur, replace=True)
+            self._fill(cur)
+
+    # --- ЧТЕНИЕ ---
+
+    def fetch_cash(self, d1, d2):
+        """[(date, op_type, payment_type, category, amount, lab_hour, lab_unlim)] за период"""
+        cur = self.db.conn.cursor()
+        if not self.installed:
+            # Агрегаты не подготовлены (база была занята при старте) — прежний запрос по операциям
+            cur.execute(f"""
+                SELECT date, operation_type, payment_type, category, SUM(COALESCE(amount, 0)),
+                       SUM({lab_count_sql('cash_transactions', 'Час:')}),
+                       SUM({lab_count_sql('cash_transactions', 'Безлим:')})
+                FROM cash_transactions
+                WHERE date >= ? AND date <= ?
+                GROUP BY date, operation_type, payment_type, category
+            """, (d1, d2))
+            return cur.fetchall()
+        cur.execute("""
+            SELECT date, op_type, payment_type, category, amount, lab_hour, lab_unlim
+            FROM daily_cash_rollup
+            WHERE date >= ? AND date <= ? AND tx_count > 0
+        """, (d1, d2))
+        return cur.fetchall()
+
+    def fetch_totals(self, d1, d2):
+        """Суммы бара/призов/праздников за период (словарь)"""
+        cur = self.db.conn.cursor()
+        if self.installed:
+            cur.execute("""
+                SELECT SUM(bar_total), SUM(bar_count), SUM(prizes_qty), SUM(prizes_tickets),
+                       SUM(banquets_count), SUM(banquets_revenue), SUM(banquets_children)
+                FROM daily_rollup
+                WHERE date >= ? AND date <= ?
+            """, (d1, d2))
+            row = [v or 0 for v in cur.fetchone()]
+        else:
+            # Прежние запросы по исходным таблицам
+            cur.execute("""
+                SELECT SUM(CASE WHEN move_type = 'продажа' THEN COALESCE(total, 0) ELSE 0 END),
+                       SUM(CASE WHEN move_type = 'продажа' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN move_type = 'выдача_приза' THEN COALESCE(qty, 0) ELSE 0 END),
+                       SUM(CASE WHEN move_type = 'выдача_приза' THEN COALESCE(total, 0) ELSE 0 END)
+                FROM stock_moves
+                WHERE move_type IN ('продажа', 'выдача_приза') AND date >= ? AND date <= ?
+            """, (d1, d2))
+            row = list(cur.fetchone())
+            cur.execute("""
+                SELECT COUNT(*), SUM(total_price), SUM(child_count)
+                FROM bookings WHERE event_date >= ? AND event_date <= ?
+            """, (d1, d2))
+            row = [v or 0 for v in row + list(cur.fetchone())]
+        keys = ("bar_total", "bar_count", "prizes_qty", "prizes_tickets",
+                "banquets_count", "banquets_revenue", "banquets_children")
+        return dict(zip(keys, row))
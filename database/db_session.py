@@ -0,0 +1,62 @@
+from database.db_tx import write_transaction
+
+# Таблицы, по которым строится отчет о смене: таблица -> колонки группировки
+SESSION_TABLES = {
+    "stock_moves": ("move_type",),
+    "cash_transactions": ("operation_type", "payment_type"),
+    "bookings": (),
+    "certificates": (),
+}
+# Колонка суммы для SUM() (если есть в таблице)
+AMOUNT_COLUMNS = {"stock_moves": "total", "cash_transactions": "amount", "bookings": "total_price", "certificates": "amount"}
+
+
+class SessionAggregates:
+    """
+    Итоги смены сотрудника одним сгруппированным запросом на таблицу
+    (по индексу user_id, timestamp), без перебора строк и разбора JSON в Python.
+    Основа отчета о смене при выключении бота (TelegramBotServer.build_session_report).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._columns = {}
+
+    def _cols(self, cur, table):
+        if table not in self._columns:
+            cur.execute(f"PRAGMA table_info({table})")
+            self._columns[table] = {row[1] for row in cur.fetchall()}
+        return self._columns[table]
+
+    def install(self):
+        """Индексы (user_id, timestamp) на таблицах, где эти колонки есть."""
+        with write_transaction(self.db.conn) as cur:
+            for table in SESSION_TABLES:
+                if {"user_id", "timestamp"} <= self._cols(cur, table):
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_ts ON {table} (user_id, timestamp)")
+
+    def collect(self, user_id, start, end=None):
+        """
+        {таблица: [(ключи_группировки..., count, sum_qty, sum_amount)]} за окно смены.
+        start/end — datetime или строка "YYYY-MM-DD HH:MM:SS".
+        """
+        since = str(start)[:19]
+        until = str(end)[:19] if end else "9999-12-31"
+        cur = self.db.conn.cursor()
+        result = {}
+        for table, group_by in SESSION_TABLES.items():
+            cols = self._cols(cur, table)
+            if not {"user_id", "timestamp"} <= cols:
+                continue
+            keys = [c for c in group_by if c in cols]
+            qty = "SUM(qty)" if "qty" in cols else "NULL"
+            amount = f"SUM({AMOUNT_COLUMNS[table]})" if AMOUNT_COLUMNS.get(table) in cols else "NULL"
+            select_keys = "".join(f"{k}, " for k in keys)
+            cur.execute(f"""
+                SELECT {select_keys}COUNT(*), {qty}, {amount}
+                FROM {table}
+                WHERE user_id = ? AND timestamp >= ? AND timestamp <= ?
+                {"GROUP BY " + ", ".join(keys) if keys else ""}
+            """, (user_id, since, until))
+            result[table] = [row for row in cur.fetchall() if row[len(keys)]]
+        return result
@@ -0,0 +1,89 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import datetime
+
+DB_PATH = "bar_uley.db"
+SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), "bar_uley_snapshots")
+
+
+class DatabaseSnapshot:
+    """
+    Согласованный снимок рабочей БД для отправки (бэкап в Telegram).
+    - Снимок делается через SQLite online backup API: попадает и содержимое WAL,
+      а приложение может продолжать писать в базу.
+    - Результат сжимается gzip потоково (без загрузки файла в память).
+    - Готовый архив кэшируется по PRAGMA data_version: пока в базу никто не писал,
+      повторные запросы отдают тот же файл без нового снимка.
+    """
+
+    def __init__(self, db_path=DB_PATH, out_dir=SNAPSHOT_DIR):
+        self.db_path = db_path
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._monitor = None  # Отдельное соединение только для чтения data_version
+        self._cached_version = None
+        self._cached_path = None
+
+    def _data_version(self):
+        # data_version меняется, когда ДРУГОЕ соединение фиксирует изменения,
+        # поэтому следим через собственное соединение, которое ничего не пишет.
+        if self._monitor is None:
+            self._monitor = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._monitor.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_compressed(self):
+        """Путь к свежему .db.gz снимку (из кэша, если база не менялась)."""
+        with self._lock:
+            version = self._data_version()
+            if version == self._cached_version and self._cached_path and os.path.exists(self._cached_path):
+                return self._cached_path
+
+            path = self._build()
+            old_path = self._cached_path
+            self._cached_version, self._cached_path = version, path
+            if old_path and old_path != path and os.path.exists(old_path):
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass  # Windows: старый снимок еще отправляется другим потоком
+            return path
+
+    def _build(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        gz_path = os.path.join(self.out_dir, f"{stem}_{stamp}.db.gz")
+
+        fd, raw_path = tempfile.mkstemp(suffix=".db", dir=self.out_dir)
+        os.close(fd)
+        try:
+            src = sqlite3.connect(self.db_path)
+            dst = sqlite3.connect(raw_path)
+            try:
+                # pages=-1: весь файл за один шаг — снимок на один момент времени
+                src.backup(dst, pages=-1)
+            finally:
+                dst.close()
+                src.close()
+
+            with open(raw_path, "rb") as f_in, gzip.open(gz_path, "wb", compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        finally:
+            os.remove(raw_path)
+        return gz_path
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(db_path=DB_PATH):
+    """Один кэш снимков на файл БД в процессе (общий для бота и рассылок)."""
+    key = os.path.abspath(db_path)
+    with _snapshots_lock:
+        if key not in _snapshots:
+            _snapshots[key] = DatabaseSnapshot(db_path)
+        return _snapshots[key]
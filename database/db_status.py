@@ -0,0 +1,118 @@
+import time
+import datetime
+
+from database.db_tx import write_transaction
+
+# Таблицы, для которых ведем счетчики строк (вместо COUNT(*) по всей таблице)
+COUNTED_TABLES = ("bookings", "stock_moves", "products")
+# Сколько секунд статус считается свежим
+STATUS_TTL = 15
+
+
+class StatusSnapshot:
+    """
+    Сводка для команды бота «ℹ️ Статус».
+    - Общее число записей берется из table_counters (поддерживается триггерами),
+      а не из COUNT(*) по многолетним таблицам.
+    - Показатели за сегодня/завтра считаются одним сгруппированным запросом.
+    - Результат кэшируется на STATUS_TTL секунд.
+    """
+
+    def __init__(self, db, ttl=STATUS_TTL):
+        self.db = db
+        self.ttl = ttl
+        self.counters_ready = False
+        self._cached = None
+        self._cached_at = 0.0
+        self._cached_day = None
+
+    def install(self):
+        """Создает table_counters и триггеры. Начальные значения — одним подсчетом."""
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS table_counters (
+                    name TEXT PRIMARY KEY,
+                    row_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            for table in COUNTED_TABLES:
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_cnt_{table}_insert AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE table_counters SET row_count = row_count + 1 WHERE name = '{table}';
+                    END
+                """)
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_cnt_{table}_delete AFTER DELETE ON {table}
+                    BEGIN
+                        UPDATE table_counters SET row_count = row_count - 1 WHERE name = '{table}';
+                    END
+                """)
+                # В той же транзакции, что и триггеры — иначе счетчик может разойтись
+                cur.execute(f"INSERT OR IGNORE INTO table_counters (name, row_count) SELECT '{table}', COUNT(*) FROM {table}")
+        self.counters_ready = True
+
+    def get(self):
+        """Словарь с показателями (из кэша, если он моложе ttl и день не сменился)."""
+        today = datetime.date.today()
+        if self._cached and self._cached_day == today and time.monotonic() - self._cached_at < self.ttl:
+            return self._cached
+
+        snapshot = self._collect(today)
+        self._cached, self._cached_at, self._cached_day = snapshot, time.monotonic(), today
+        return snapshot
+
+    def invalidate(self):
+        self._cached = None
+
+    def _collect(self, today):
+        today_str = today.strftime("%Y-%m-%d")
+        tomorrow_str = (today + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+        if self.counters_ready:
+            totals_sql = "SELECT 'total', name, row_count, NULL FROM table_counters"
+        else:
+            totals_sql = " UNION ALL ".join(
+                f"SELECT 'total', '{t}', (SELECT COUNT(*) FROM {t}), NULL" for t in COUNTED_TABLES)
+
+        cur = self.db.conn.cursor()
+        cur.execute(f"""
+            SELECT 'move', move_type, COUNT(*), SUM(total)
+            FROM stock_moves
+            WHERE date = ? AND move_type IN ('продажа', 'выдача_приза')
+            GROUP BY move_type
+            UNION ALL
+            SELECT 'event', event_date, COUNT(*), NULL
+            FROM bookings
+            WHERE event_date IN (?, ?)
+            GROUP BY event_date
+            UNION ALL
+            {totals_sql}
+            UNION ALL
+            SELECT 'last', NULL, NULL, (SELECT timestamp FROM user_actions_log ORDER BY rowid DESC LIMIT 1)
+        """, (today_str, today_str, tomorrow_str))
+
+        snap = {
+            "bar_sales_count": 0, "bar_sales_total": 0,
+            "prizes_count": 0, "prizes_tickets": 0,
+            "events_today": 0, "events_tomorrow": 0,
+            "total_bookings": 0, "total_moves": 0, "total_products": 0,
+            "last_activity": None,
+        }
+        totals_keys = {"bookings": "total_bookings", "stock_moves": "total_moves", "products": "total_products"}
+
+        for kind, key, count, value in cur.fetchall():
+            if kind == "move" and key == "продажа":
+                snap["bar_sales_count"], snap["bar_sales_total"] = count, value or 0
+            elif kind == "move":
+                snap["prizes_count"], snap["prizes_tickets"] = count, value or 0
+            elif kind == "event":
+                snap["events_today" if key == today_str else "events_tomorrow"] = count
+            elif kind == "total" and key in totals_keys:
+                snap[totals_keys[key]] = count
+            elif kind == "last":
+                snap["last_activity"] = value
+
+        # Баланс кассы — готовый метод FinanceMixin (второй запрос)
+        snap["balance"] = self.db.get_cash_balance_breakdown()
+        return snap
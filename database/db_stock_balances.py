@@ -0,0 +1,143 @@
+import argparse
+import sqlite3
+import types
+
+from database.db_tx import write_transaction
+
+# Движения, увеличивающие/уменьшающие остаток (те же списки, что в расчете calc_stock)
+STOCK_IN_TYPES = ("приход", "излишек_инв")
+STOCK_OUT_TYPES = ("продажа", "списание", "выдача_приза", "недостача_инв")
+
+# Расхождения меньше этого считаем погрешностью округления
+DRIFT_EPS = 1e-6
+
+
+def _signed_qty_sql(row):
+    ins = ", ".join(f"'{t}'" for t in STOCK_IN_TYPES)
+    outs = ", ".join(f"'{t}'" for t in STOCK_OUT_TYPES)
+    return (f"(CASE WHEN {row}.move_type IN ({ins}) THEN COALESCE({row}.qty, 0) "
+            f"WHEN {row}.move_type IN ({outs}) THEN -COALESCE({row}.qty, 0) ELSE 0 END)")
+
+
+def _apply_sql(row, sign):
+    return f"""
+        INSERT INTO stock_balances (product_id, qty) SELECT {row}.product_id, 0
+        WHERE {row}.product_id IS NOT NULL
+        ON CONFLICT (product_id) DO NOTHING;
+        UPDATE stock_balances SET qty = qty {sign} {_signed_qty_sql(row)}
+        WHERE product_id = {row}.product_id;
+    """
+
+
+class StockBalances:
+    """
+    Текущие остатки по товарам (таблица stock_balances).
+    Поддерживаются триггерами на stock_moves в той же транзакции, что и само движение
+    (add_stock_move, update_*_move, delete_move), поэтому чтение остатков — O(товаров),
+    сколько бы лет истории ни накопилось. verify()/rebuild() сверяют с полным пересчетом.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def install(self):
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_balances'")
+            is_new = cur.fetchone() is None
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stock_balances (
+                    product_id INTEGER PRIMARY KEY,
+                    qty REAL NOT NULL DEFAULT 0
+                )
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_stock_balance_insert AFTER INSERT ON stock_moves
+                BEGIN {_apply_sql('NEW', '+')} END
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_stock_balance_delete AFTER DELETE ON stock_moves
+                BEGIN {_apply_sql('OLD', '-')} END
+            """)
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_stock_balance_update
+                AFTER UPDATE OF product_id, qty, move_type ON stock_moves
+                BEGIN {_apply_sql('OLD', '-')} {_apply_sql('NEW', '+')} END
+            """)
+            if is_new:
+                self._fill(cur)
+
+    def _fill(self, cur):
+        cur.execute("DELETE FROM stock_balances")
+        cur.execute(f"""
+            INSERT INTO stock_balances (product_id, qty)
+            SELECT p.id, COALESCE((SELECT SUM({_signed_qty_sql('m')}) FROM stock_moves m WHERE m.product_id = p.id), 0)
+            FROM products p
+        """)
+
+    # --- ЧТЕНИЕ ---
+
+    def fetch(self):
+        """{product_id: остаток} по всем товарам"""
+        cur = self.db.conn.cursor()
+        cur.execute("SELECT product_id, qty FROM stock_balances")
+        return dict(cur.fetchall())
+
+    def fetch_products(self, product_type="товар"):
+        """
+        [(id, товар, ед., остаток)] по товарам типа product_type, по имени.
+        Техкарты (товары с рецептом) не входят — их остаток считается по ингредиентам.
+        """
+        cur = self.db.conn.cursor()
+        cur.execute("""
+            SELECT p.id, p.name, p.uom, COALESCE(b.qty, 0)
+            FROM products p
+            LEFT JOIN stock_balances b ON b.product_id = p.id
+            WHERE p.type = ? AND NOT EXISTS (SELECT 1 FROM recipes r WHERE r.drink_id = p.id)
+            ORDER BY p.name
+        """, (product_type,))
+        return cur.fetchall()
+
+    def get(self, product_id):
+        cur = self.db.conn.cursor()
+        cur.execute("SELECT qty FROM stock_balances WHERE product_id = ?", (product_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+    # --- СВЕРКА ---
+
+    def verify(self):
+        """
+        Сверяет сохраненные остатки с пересчетом по всей истории движений.
+        Возвращает список расхождений [(product_id, в_таблице, по_истории)].
+        """
+        cur = self.db.conn.cursor()
+        cur.execute(f"""
+            SELECT p.id,
+                   COALESCE(b.qty, 0),
+                   COALESCE((SELECT SUM({_signed_qty_sql('m')}) FROM stock_moves m WHERE m.product_id = p.id), 0)
+            FROM products p
+            LEFT JOIN stock_balances b ON b.product_id = p.id
+        """)
+        return [(pid, stored, actual) for pid, stored, actual in cur.fetchall() if abs(stored - actual) > DRIFT_EPS]
+
+    def rebuild(self):
+        """Пересчитывает остатки из истории. Возвращает найденные до пересчета расхождения."""
+        drift = self.verify()
+        with write_transaction(self.db.conn) as cur:
+            self._fill(cur)
+        return drift
+
+
+if __name__ == "__main__":
+    # python -m database.db_stock_balances [--rebuild] [путь_к_бд]
+    parser = argparse.ArgumentParser(description="Сверка материализованных остатков с историей движений")
+    parser.add_argument("db_path", nargs="?", default="bar_uley.db")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать остатки из истории")
+    args = parser.parse_args()
+
+    balances = StockBalances(types.SimpleNamespace(conn=sqlite3.connect(args.db_path)))
+    balances.install()
+    drift = balances.rebuild() if args.rebuild else balances.verify()
+    for pid, stored, actual in drift:
+        print(f"Товар #{pid}: в таблице {stored:g}, по истории {actual:g} (разница {stored - actual:+g})")
+    print(f"Расхождений: {len(drift)}" + (" — остатки пересчитаны" if args.rebuild and drift else ""))
@@ -0,0 +1,99 @@
+import json
+import datetime
+from database.db_tx import write_transaction
+
+# Поля движения и значения по умолчанию (как у add_stock_move)
+MOVE_FIELDS = {
+    "date": None, "product_id": None, "qty": 0, "move_type": None,
+    "unit_price": 0, "total": 0, "employee": None, "comment": None,
+    "payment_type": None, "writeoff_type": None, "salary_person": None, "user_id": None,
+}
+# Без этих полей строка не записывается
+REQUIRED_FIELDS = ("date", "product_id", "move_type")
+# Проверка порога автобэкапа у DatabaseManager (та же, что после add_stock_move)
+AUTO_BACKUP_HOOK = "check_auto_backup"
+
+
+def _date_str(d):
+    return d.toString("yyyy-MM-dd") if hasattr(d, "toString") else str(d)
+
+
+class StockBatch:
+    """
+    Пакетная запись движений товара (инвентаризация, многострочная продажа).
+    Все строки — одна транзакция: один executemany для stock_moves, один для журнала
+    user_actions_log и одно увеличение счетчика операций до автобэкапа.
+    Либо записываются все строки, либо ни одной. Если у вызывающего уже открыта
+    транзакция, пачка пишется внутри нее (SAVEPOINT) и фиксируется вместе с ней.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def bulk_add_stock_moves(self, moves, user_id=None):
+        """
+        moves — список словарей с полями add_stock_move (date, product_id, qty, move_type, ...).
+        Возвращает список id созданных движений.
+        """
+        if not moves:
+            return []
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for i, m in enumerate(moves):
+            missing = [f for f in REQUIRED_FIELDS if m.get(f) is None]
+            if missing:
+                raise ValueError(f"Движение #{i + 1}: не заполнено {', '.join(missing)}")
+            row = {**MOVE_FIELDS, **m}
+            row["date"] = _date_str(row["date"])
+            row["user_id"] = row["user_id"] if row["user_id"] is not None else user_id
+            rows.append(row)
+
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("PRAGMA table_info(stock_moves)")
+            existing = {r[1] for r in cur.fetchall()}
+            cols = [c for c in MOVE_FIELDS if c in existing]
+            if "timestamp" in existing:
+                cols.append("timestamp")
+                for row in rows:
+                    row["timestamp"] = now
+
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM stock_moves")
+            last_id = cur.fetchone()[0]
+            cur.executemany(
+                f"INSERT INTO stock_moves ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                [tuple(row[c] for c in cols) for row in rows])
+            # Запись заблокирована (наша или уже открытая транзакция), поэтому новые id — ровно наши строки
+            cur.execute("SELECT id FROM stock_moves WHERE id > ? ORDER BY id", (last_id,))
+            ids = [r[0] for r in cur.fetchall()]
+
+            self._log_moves(cur, ids, rows, user_id, now)
+
+        # Один шаг счетчика на всю пачку (а не по шагу на строку)
+        self.db._ops_since_backup = getattr(self.db, "_ops_since_backup", 0) + 1
+        check_backup = getattr(self.db, AUTO_BACKUP_HOOK, None)
+        if check_backup:
+            check_backup()
+        return ids
+
+    def _log_moves(self, cur, ids, rows, user_id, now):
+        pids = sorted({row["product_id"] for row in rows})
+        cur.execute(f"SELECT id, name FROM products WHERE id IN ({', '.join('?' * len(pids))})", pids)
+        names = dict(cur.fetchall())
+
+        entries = []
+        for move_id, row in zip(ids, rows):
+            details = {"type": row["move_type"], "product_id": row["product_id"],
+                       "product": names.get(row["product_id"], "?"), "qty": row["qty"], "total": row["total"], "date": row["date"]}
+            if row["writeoff_type"]:
+                details["writeoff_type"] = row["writeoff_type"]
+            entries.append((row["user_id"] or user_id, "create", "stock_moves", move_id,
+                            None, json.dumps(details, ensure_ascii=False), now))
+        self.bulk_log_actions(cur, entries)
+
+    @staticmethod
+    def bulk_log_actions(cur, entries):
+        """entries: [(user_id, action_type, table_name, record_id, old_values, new_values, timestamp)]"""
+        cur.executemany("""
+            INSERT INTO user_actions_log (user_id, action_type, table_name, record_id, old_values, new_values, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, entries)
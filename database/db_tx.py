@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def write_transaction(conn, name="write_tx"):
+    """
+    Транзакция записи для пакетных операций и миграций.
+    - Соединение свободно: своя транзакция BEGIN IMMEDIATE ... COMMIT (блокировка записи сразу).
+    - У вызывающего уже открыта транзакция: SAVEPOINT внутри нее. Его незафиксированные
+      изменения не коммитятся, при ошибке откатывается только наша часть, а фиксирует
+      все вместе вызывающий.
+    """
+    cur = conn.cursor()
+    if conn.in_transaction:
+        cur.execute(f"SAVEPOINT {name}")
+        try:
+            yield cur
+        except BaseException:
+            cur.execute(f"ROLLBACK TO {name}")
+            cur.execute(f"RELEASE {name}")
+            raise
+        cur.execute(f"RELEASE {name}")
+    else:
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield cur
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("COMMIT")
@@ -0,0 +1,44 @@
+import sqlite3
+
+from database.db_tx import write_transaction
+
+
+class DataVersions:
+    """
+    Счетчики версий данных по таблицам (таблица data_versions).
+    Счетчик увеличивают триггеры SQLite на INSERT/UPDATE/DELETE, поэтому он
+    срабатывает при записи из любого места программы и любого соединения.
+    Используется для инвалидации кэшей: пока версия та же — кэш актуален.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def watch(self, table):
+        """Создает (если нет) счетчик и триггеры для таблицы table."""
+        with write_transaction(self.db.conn) as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            cur.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)", (table,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_dv_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                    END
+                """)
+
+    def get(self, table):
+        """Текущая версия таблицы (None, если счетчик не настроен)."""
+        try:
+            cur = self.db.conn.cursor()
+            cur.execute("SELECT version FROM data_versions WHERE name = ?", (table,))
+            row = cur.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
@@ -0,0 +1,79 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from database.db_changes import ChangeFeed
+
+# Пауза перед обработкой: серия записей (инвентаризация, продажа с ингредиентами) -> одно событие
+DEBOUNCE_MS = 250
+# Опрос ленты, чтобы заметить записи из других окон и соединений
+POLL_MS = 3000
+# Очищать старые записи ленты раз в столько опросов
+PRUNE_EVERY = 100
+
+
+class StockChangeNotifier(QObject):
+    """
+    Сигнал об изменениях stock_moves с затронутыми датами, товарами и движениями.
+    notify() после своей записи — событие придет через DEBOUNCE_MS, все записи
+    за это время объединяются в одно.
+    """
+    changed = pyqtSignal(object, object, object, object)  # множества: даты, id товаров, id движений, типы движений
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.feed = ChangeFeed(db)
+        self.enabled = True
+        try:
+            self.feed.install()
+            self.last_seq = self.feed.latest()
+        except Exception as e:
+            print(f"⚠️ Лента изменений недоступна ({e})")
+            self.enabled = False
+            return
+        self.polls = 0
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(DEBOUNCE_MS)
+        self.debounce.timeout.connect(self.poll)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(POLL_MS)
+        self.timer.timeout.connect(self.notify)
+        self.timer.start()
+
+    def notify(self):
+        """Проверить ленту чуть позже (повторные вызовы в пределах паузы объединяются)."""
+        if self.enabled:
+            self.debounce.start()
+
+    def poll(self):
+        # Слот таймера: ошибка базы (например, «database is locked», пока другое соединение
+        # держит запись) не должна выходить наружу — PyQt6 завершает программу на исключении в слоте
+        try:
+            rows = self.feed.since(self.last_seq)
+        except Exception as e:
+            print(f"⚠️ Лента изменений: чтение не удалось ({e})")
+            return
+        self.polls += 1
+        if self.polls % PRUNE_EVERY == 0:
+            try:
+                self.feed.prune()
+            except Exception as e:
+                print(f"⚠️ Лента изменений: очистка отложена ({e})")
+        if not rows:
+            return
+        self.last_seq = rows[-1][0]
+        dates, products, moves, types = set(), set(), set(), set()
+        for _, move_id, date, product_id, move_type in rows:
+            dates.add(date); products.add(product_id); moves.add(move_id); types.add(move_type)
+        self.changed.emit(dates, products, moves, types)
+
+
+_notifier = None
+
+
+def get_change_notifier(db):
+    """Общий на приложение источник уведомлений (одна лента, один таймер опроса)"""
+    global _notifier
+    if _notifier is None:
+        _notifier = StockChangeNotifier(db)
+    return _notifier
@@ -0,0 +1,178 @@
+import copy
+import os
+import sqlite3
+import webbrowser
+from collections import deque
+from PyQt6.QtCore import QCoreApplication, QThread, pyqtSignal
+from core.report_render import write_report
+from database.db_report_cache import ReportCache
+
+# Как часто сообщать о ходе записи (в кусках отчета)
+PROGRESS_EVERY = 200
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+class ReportWorker(QThread):
+    """
+    Фоновое формирование HTML-отчета.
+    build(db) выполняется в отдельном потоке со своим соединением SQLite только для чтения
+    (копия DatabaseManager, у которой подменено conn), результат — строка или генератор
+    кусков — пишется в файл через write_report. Окно кассы при этом не замирает.
+    Копия поверхностная: остальные атрибуты (кэши, флаги) общие с GUI-потоком, поэтому
+    build только читает через db.conn и не меняет состояние db.
+    cache=(вид, параметры, дата_с, дата_по) — взять готовый отчет из ReportCache, если данные
+    за период не менялись.
+    """
+    progress_signal = pyqtSignal(int)             # записано кусков
+    finished_signal = pyqtSignal(bool, str, str)  # успех, путь к файлу, текст ошибки
+
+    def __init__(self, db, build, path, open_browser=True, cache=None):
+        super().__init__()
+        self.db = db
+        self.build = build
+        self.path = path
+        self.open_browser = open_browser
+        self.cache = cache
+        self.cancelled = False
+        self.conn = None
+        self.db_file = self._db_file(db)
+
+    @staticmethod
+    def _db_file(db):
+        cur = db.conn.cursor()
+        cur.execute("PRAGMA database_list")
+        for _, name, file in cur.fetchall():
+            if name == "main":
+                return file
+        return None
+
+    def cancel(self):
+        self.cancelled = True
+        # Прервать выполняющийся запрос (interrupt можно вызывать из другого потока)
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass  # соединение уже закрыто — отчет завершился
+
+    def _guarded(self, parts):
+        for i, part in enumerate(parts, 1):
+            if self.cancelled:
+                raise ReportCancelled()
+            if i % PROGRESS_EVERY == 0:
+                self.progress_signal.emit(i)
+            yield part
+
+    def run(self):
+        conn = None
+        try:
+            if self.cancelled:
+                raise ReportCancelled()
+            if not self.db_file:
+                raise RuntimeError("База в памяти — фоновый отчет невозможен")
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False)
+            self.conn = conn
+            if self.cancelled:
+                raise ReportCancelled()
+            # Только подмена соединения: остальное состояние DatabaseManager общее (см. docstring)
+            ro_db = copy.copy(self.db)
+            ro_db.conn = conn
+
+            report_cache = ReportCache(ro_db) if self.cache else None
+            key = report_cache.key(*self.cache) if report_cache else None
+            if not (key and report_cache.fetch(key, self.path)):
+                content = self.build(ro_db)
+                if self.cancelled:
+                    raise ReportCancelled()
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                write_report(self.path, content if isinstance(content, str) else self._guarded(content))
+                # Если данные менялись во время построения — в кэш не кладем
+                if key and report_cache.key(*self.cache) == key:
+                    report_cache.store(key, self.path)
+            if self.open_browser:
+                webbrowser.open(os.path.abspath(self.path))
+            self.finished_signal.emit(True, self.path, "")
+        except ReportCancelled:
+            self.finished_signal.emit(False, self.path, "Отменено")
+        except Exception as e:
+            if self.cancelled:
+                self.finished_signal.emit(False, self.path, "Отменено")
+            else:
+                self.finished_signal.emit(False, self.path, str(e))
+        finally:
+            self.conn = None
+            if conn is not None:
+                conn.close()
+
+
+class ReportQueue:
+    """
+    Очередь фоновых отчетов: задания выполняются по одному (не нагружаем базу
+    параллельными тяжелыми чтениями), вкладки только ставят задание и получают сигнал.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.current = None
+        self.previous = None
+        self.cache_installed = False
+        # При выходе из программы — отменить отчеты и дождаться текущего потока
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def submit(self, db, build, path, on_done=None, on_progress=None, open_browser=True, cache=None):
+        """Ставит отчет в очередь. on_done(ok, path, error) вызывается в GUI-потоке."""
+        if cache and not self.cache_installed:
+            # Триггеры версий дат ставятся через основное соединение (в фоне оно только для чтения)
+            try:
+                ReportCache(db).install()
+            except Exception as e:
+                print(f"⚠️ Кэш отчетов отключен ({e})")
+            self.cache_installed = True
+        worker = ReportWorker(db, build, path, open_browser, cache)
+        if on_done:
+            worker.finished_signal.connect(on_done)
+        if on_progress:
+            worker.progress_signal.connect(on_progress)
+        worker.finished.connect(self._start_next)
+        self.pending.append(worker)
+        if self.current is None:
+            self._start_next()
+        return worker
+
+    def cancel_all(self):
+        for worker in self.pending:
+            worker.cancel()
+        if self.current:
+            self.current.cancel()
+
+    def shutdown(self):
+        """Отмена всех отчетов и ожидание текущего потока (QThread нельзя удалять работающим)."""
+        self.cancel_all()
+        self.pending.clear()
+        for worker in (self.current, self.previous):
+            if worker is not None:
+                worker.wait()
+
+    def _start_next(self):
+        # Ссылки на потоки держим до их полного завершения (иначе QThread удалит сборщик мусора)
+        self.previous = self.current
+        self.current = self.pending.popleft() if self.pending else None
+        if self.current:
+            self.current.start()
+
+
+_queue = None
+
+
+def get_report_queue():
+    """Общая очередь отчетов приложения"""
+    global _queue
+    if _queue is None:
+        _queue = ReportQueue()
+    return _queue
@@ -1,19 +1,38 @@
-import urllib.request
-import urllib.parse
 import json
 import time
 import datetime
 import os
-import uuid
-import re
+import random
 from PyQt6.QtCore import QThread, pyqtSignal
 from core.settings import TG_BOT_TOKEN
 from database.db_manager import DatabaseManager
-from core.activity_logger import SessionInspector
+from database.db_snapshot import get_snapshot
+from database.db_versions import DataVersions
+from database.db_status import StatusSnapshot
+from database.db_rollup import DailyRollup
+from database.db_audit import AuditLog
+from database.db_archive import LogArchive
+from database.db_session import SessionAggregates
+from database.db_migrations import migrate
+from database.db_queries import (
+    BOT_TOP_SALES_DAY, BOT_TOP_SALES_PERIOD, BOT_SALARY_WRITEOFFS, BOT_BANQUETS_DAY, BOT_BANQUETS_RANGE
+)
+from services.tg_transport import get_transport, MultipartBody
 
 # Версия приложения для отображения в статусе
 CURRENT_VERSION = "3.3"
 
+# Long polling: сервер Telegram держит getUpdates открытым до POLL_TIMEOUT сек
+# и отвечает сразу, как только приходит сообщение.
+POLL_TIMEOUT = 30
+POLL_TIMEOUT_MIN = 25
+POLL_TIMEOUT_MAX = 50
+# Пауза после ошибки растет экспоненциально (с джиттером) до BACKOFF_MAX сек
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+# Перенос полей старых записей журнала: секунд работы между опросами
+AUDIT_BACKFILL_SLICE = 0.5
+
 class TelegramBotServer(QThread):
     """
     УЛЬТИМАТИВНЫЙ сервер Telegram-бота.
@@ -26,17 +45,27 @@ class TelegramBotServer(QThread):
     # === ВАШ СУПЕР ID (Доступ всегда разрешен) ===
     SUPER_ADMIN_ID = "435729921"
 
-    def __init__(self, user_name=None):
+    def __init__(self, user_name=None, poll_timeout=POLL_TIMEOUT):
         super().__init__()
         self.running = True
         self.user_name = user_name
         self.db = None 
         self.offset = 0
-        self.api_url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/"
+        self.poll_timeout = max(POLL_TIMEOUT_MIN, min(POLL_TIMEOUT_MAX, poll_timeout))
+        self.transport = get_transport()  # Общий keep-alive пул соединений
         self.session_start = None  # Время начала слежки
         
         # Хранилище состояний пользователей: {chat_id: 'state'}
         self.user_states = {}
+        
+        # Кэш разрешенных Telegram ID (сбрасывается при изменении таблицы users)
+        self.versions = None
+        self._allowed_ids = set()
+        self._allowed_version = None
+        self.status = None
+        self.rollup = None
+        self.audit = None
+        self.audit_pending = False
 
     def run(self):
         if not TG_BOT_TOKEN:
@@ -44,91 +73,102 @@ class TelegramBotServer(QThread):
             return
 
         self.db = DatabaseManager()
+        migrate(self.db)
         self.session_start = datetime.datetime.now() # Фиксируем время входа
+        
+        self.versions = DataVersions(self.db)
+        try:
+            self.versions.watch("users")
+        except Exception as e:
+            print(f"⚠️ БОТ: кэш доступа отключен ({e})")
+        
+        self.status = StatusSnapshot(self.db)
+        try:
+            self.status.install()
+        except Exception as e:
+            print(f"⚠️ БОТ: счетчики статуса недоступны, будет COUNT(*) ({e})")
+        
+        self.rollup = DailyRollup(self.db)
+        try:
+            self.rollup.install()
+        except Exception as e:
+            print(f"⚠️ БОТ: не удалось подготовить дневные агрегаты ({e})")
+        
+        try:
+            SessionAggregates(self.db).install()  # отчет о смене при выключении
+        except Exception as e:
+            print(f"⚠️ БОТ: индексы отчета о смене не созданы ({e})")
+        
+        # Поля журнала для старых записей: migrate() переносит их понемногу при каждом запуске,
+        # бот доводит перенос до конца между опросами (короткими пачками, не мешая записи из программы)
+        self.audit = AuditLog(self.db)
+        self.audit_pending = True
 
         if self.user_name:
             self.send_startup_notification()
 
         print("🤖 Бот запущен! Ожидание сообщений...")
         
+        failures = 0
         while self.running:
             try:
-                self.check_updates()
+                if self.check_updates():
+                    failures = 0
+                    self.continue_audit_backfill()
+                    continue
+                failures += 1
             except Exception as e:
                 print(f"⚠️ Ошибка бота: {e}")
-                time.sleep(5)
-            time.sleep(1)
+                failures += 1
+            # Пауза только после сбоя: 1, 2, 4... сек (+ джиттер), но не больше BACKOFF_MAX
+            self.backoff_sleep(failures)
             
         if self.user_name:
             self.send_shutdown_notification()
 
     def stop(self):
         self.running = False
+        # Не ждать конца long polling (до poll_timeout + 10 сек): обрываем текущий getUpdates
+        self.transport.abort("getUpdates")
 
-    def api_call(self, method, params=None):
+    def backoff_sleep(self, failures):
+        """Экспоненциальная пауза с джиттером; прерывается при stop()"""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** min(failures - 1, 10)))
+        delay = random.uniform(delay / 2, delay)
+        deadline = time.monotonic() + delay
+        while self.running and time.monotonic() < deadline:
+            time.sleep(min(0.5, deadline - time.monotonic()))
+
+    def api_call(self, method, params=None, timeout=5):
         try:
-            url = self.api_url + method
-            data = None
-            headers = {}
-            if params:
-                data = json.dumps(params).encode('utf-8')
-                headers = {'Content-Type': 'application/json'}
-            
-            req = urllib.request.Request(url, data=data, headers=headers)
-            with urllib.request.urlopen(req, timeout=5) as response:
-                return json.loads(response.read().decode('utf-8'))
+            _status, data = self.transport.call(method, params, timeout=timeout)
+            return data
         except:
             return None
 
     def send_document(self, chat_id, file_obj, filename, caption=""):
-        """Отправка файла из памяти или с диска"""
-        url = self.api_url + "sendDocument"
-        boundary = uuid.uuid4().hex
-        
-        data = []
-        # chat_id
-        data.append(f'--{boundary}'.encode('utf-8'))
-        data.append(f'Content-Disposition: form-data; name="chat_id"'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        data.append(str(chat_id).encode('utf-8'))
-        
-        # caption
+        """Отправка файла из памяти (bytes) или с диска (путь) — файл читается потоково"""
+        fields = {"chat_id": chat_id}
         if caption:
-            data.append(f'--{boundary}'.encode('utf-8'))
-            data.append(f'Content-Disposition: form-data; name="caption"'.encode('utf-8'))
-            data.append(''.encode('utf-8'))
-            data.append(str(caption).encode('utf-8').decode('utf-8').encode('utf-8'))
-
-        # file
-        data.append(f'--{boundary}'.encode('utf-8'))
-        data.append(f'Content-Disposition: form-data; name="document"; filename="{filename}"'.encode('utf-8'))
-        data.append('Content-Type: application/octet-stream'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        
-        if isinstance(file_obj, str): # Путь к файлу
-            with open(file_obj, 'rb') as f:
-                data.append(f.read())
-        else: # Объект в памяти
-            data.append(file_obj)
-            
-        data.append(f'--{boundary}--'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        
-        body = b'\r\n'.join(data)
-        headers = {
-            'Content-Type': f'multipart/form-data; boundary={boundary}',
-            'Content-Length': str(len(body))
-        }
+            fields["caption"] = caption
         
         try:
-            req = urllib.request.Request(url, data=body, headers=headers, method='POST')
-            urllib.request.urlopen(req, timeout=60)
+            body = MultipartBody(fields, "document", filename, file_obj)
+            self.transport.request("sendDocument", body, body.headers, timeout=60)
         except Exception as e:
             self.send_message(chat_id, f"❌ Ошибка отправки файла: {e}")
 
     def check_updates(self):
-        res = self.api_call("getUpdates", {"offset": self.offset, "timeout": 2})
-        if not res or not res.get("ok"): return
+        """
+        Один long-polling запрос getUpdates.
+        Возвращает True, если запрос прошел успешно (даже без новых сообщений).
+        """
+        if not self.running:
+            return False
+        # Клиентский таймаут чуть больше серверного, чтобы не рвать ожидание
+        res = self.api_call("getUpdates", {"offset": self.offset, "timeout": self.poll_timeout},
+                            timeout=self.poll_timeout + 10)
+        if not res or not res.get("ok"): return False
         
         for update in res.get("result", []):
             self.offset = update["update_id"] + 1
@@ -141,16 +181,14 @@ class TelegramBotServer(QThread):
             
             print(f"📩 Бот получил: '{text}' от {user_name} ({chat_id})")
             self.handle_message(chat_id, text, user_name)
+        return True
 
     def handle_message(self, chat_id, text, user_name):
         if text == "/id":
             self.send_message(chat_id, f"🆔 Твой ID: <code>{chat_id}</code>")
             return
 
-        if self.db:
-            allowed_ids = self.db.get_telegram_recipients()
-        else:
-            allowed_ids = []
+        allowed_ids = self.get_allowed_ids()
         
         is_super_admin = (str(chat_id) == self.SUPER_ADMIN_ID)
         
@@ -362,11 +400,21 @@ class TelegramBotServer(QThread):
         if reply_markup: params["reply_markup"] = reply_markup
         self.api_call("sendMessage", params)
 
+    def get_allowed_ids(self):
+        """
+        Множество Telegram ID активных сотрудников.
+        Перечитывается из БД только если таблица users менялась (см. DataVersions).
+        """
+        if not self.db:
+            return set()
+        version = self.versions.get("users") if self.versions else None
+        if version is None or version != self._allowed_version:
+            self._allowed_ids = {str(tid) for tid in self.db.get_telegram_recipients()}
+            self._allowed_version = version
+        return self._allowed_ids
+
     def _get_all_recipients(self):
-        recipients = self.db.get_telegram_recipients()
-        if self.SUPER_ADMIN_ID not in recipients:
-            recipients.append(self.SUPER_ADMIN_ID)
-        return set(recipients)
+        return self.get_allowed_ids() | {self.SUPER_ADMIN_ID}
 
     def send_startup_notification(self):
         """Уведомление о старте (ТОЛЬКО СУПЕР АДМИНУ)"""
@@ -388,9 +436,7 @@ class TelegramBotServer(QThread):
             msg = ""
             if res:
                 user_id = res[0]
-                # === ВЫЗОВ МОЗГА (Activity Logger) ===
-                inspector = SessionInspector(self.db)
-                msg = inspector.get_session_report(user_id, self.session_start, self.user_name)
+                msg = self.build_session_report(user_id, self.session_start, self.user_name)
             else:
                 # Если пользователя вдруг нет в базе (странно, но бывает)
                 msg = f"🔴 <b>БОТ ОСТАНОВЛЕН</b>\n\n👤 Пользователь: <b>{self.user_name}</b> (Не найден в БД)\n⚠️ Детальный отчет недоступен."
@@ -402,9 +448,65 @@ class TelegramBotServer(QThread):
             err_msg = f"🔴 <b>БОТ ОСТАНОВЛЕН (Ошибка отчета)</b>\n\n👤 {self.user_name}\n⚠️ Ошибка: {e}"
             self.send_message(self.SUPER_ADMIN_ID, err_msg)
 
+    def build_session_report(self, user_id, start, user_name, end=None):
+        """
+        Отчет о смене: итоги SessionAggregates.collect (по одному сгруппированному запросу
+        на таблицу) и удаления из журнала (AuditLog.session_summary).
+        """
+        end = end or datetime.datetime.now()
+        totals = SessionAggregates(self.db).collect(user_id, start, end)
+        minutes = int((end - start).total_seconds() // 60) if isinstance(start, datetime.datetime) else None
+
+        msg = f"🔴 <b>БОТ ОСТАНОВЛЕН</b>\n\n👤 Пользователь: <b>{user_name}</b>\n"
+        if minutes is not None:
+            msg += f"🕒 Смена: {start.strftime('%H:%M')} – {end.strftime('%H:%M')} ({minutes // 60} ч {minutes % 60} мин)\n"
+
+        moves = totals.get("stock_moves", [])
+        if moves:
+            msg += "\n📦 <b>Склад:</b>\n"
+            for move_type, count, qty, amount in moves:
+                msg += f"• {move_type or '?'}: {count} опер., {qty or 0:.0f} шт"
+                msg += f", {amount:.0f}р\n" if amount else "\n"
+
+        cash = totals.get("cash_transactions", [])
+        if cash:
+            msg += "\n💰 <b>Касса:</b>\n"
+            for *keys, count, _qty, amount in cash:
+                label = " / ".join(str(k) for k in keys if k) or "операции"
+                msg += f"• {label}: {count} шт, {amount or 0:.0f}р\n"
+
+        for table, title in (("bookings", "🎉 Банкеты"), ("certificates", "🎟 Сертификаты")):
+            for count, _qty, amount in totals.get(table, []):
+                msg += f"\n{title}: {count} шт, {amount or 0:.0f}р\n"
+
+        deletes = [(table, count) for table, action, _t, count, _q, _a
+                   in self.audit.session_summary(user_id, start, end) if action == "delete"]
+        if deletes:
+            msg += "\n🗑 <b>Удаления:</b> " + ", ".join(f"{t} ({n})" for t, n in deletes) + "\n"
+
+        if not (moves or cash or deletes or any(totals.get(t) for t in ("bookings", "certificates"))):
+            msg += "\n📭 Действий за смену нет.\n"
+        return msg
+
+    def continue_audit_backfill(self):
+        if not self.audit_pending:
+            return
+        try:
+            self.audit_pending = not self.audit.backfill(max_seconds=AUDIT_BACKFILL_SLICE)
+        except Exception as e:
+            print(f"⚠️ БОТ: перенос полей журнала отложен до следующего запуска ({e})")
+            self.audit_pending = False
+
     def send_log_report(self, chat_id, user_id=None, limit=20):
         """Отправляет последние действия из журнала в читаемом виде"""
-        logs = self.db.fetch_actions_log(limit=limit, user_id=user_id)
+        logs = self.audit.fetch(user_id=user_id, limit=limit)
+        if len(logs) < limit:
+            # Закрытые месяцы перенесены в годовые архивы (db_archive) — дочитываем оттуда
+            try:
+                logs += self.audit.fetch_archived(LogArchive(self.db), user_id,
+                                                  logs[-1][0] if logs else None, limit - len(logs))
+            except Exception as e:
+                print(f"⚠️ БОТ: архив журнала недоступен ({e})")
         
         if not logs:
             self.send_message(chat_id, "📭 Журнал пуст по вашему запросу.")
@@ -412,7 +514,7 @@ class TelegramBotServer(QThread):
             
         msg = f"📋 <b>ЖУРНАЛ ДЕЙСТВИЙ ({len(logs)}):</b>\n"
         
-        for ts, full_name, username, action, table, rid, old, new in logs:
+        for ts, full_name, username, action, table, rid, old, new, *fields in logs:
             # Форматируем время (только HH:MM)
             try:
                 dt = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
@@ -420,8 +522,8 @@ class TelegramBotServer(QThread):
             except:
                 time_fmt = ts
             
-            # Парсим JSON
-            details = self.format_log_entry(table, action, new)
+            # Типизированные поля, JSON — только для остального
+            details = self.format_log_entry(table, action, new, fields)
             
             # Эмодзи действия
             icon = "📝"
@@ -434,9 +536,16 @@ class TelegramBotServer(QThread):
             
         self.send_message(chat_id, msg)
 
-    def format_log_entry(self, table, action, json_str):
-        """Превращает технический JSON в человеко-читаемую строку"""
+    def format_log_entry(self, table, action, json_str, fields=None):
+        """
+        Превращает технический JSON в человеко-читаемую строку.
+        fields — (ev_type, ev_product, ev_qty, ev_amount, ev_category) из AuditLog.fetch:
+        продажи, призы, приходы и касса выводятся по ним без разбора JSON.
+        """
         if not json_str: return "Без деталей"
+        text = self.format_log_fields(table, fields) if fields else None
+        if text:
+            return text
         try:
             data = json.loads(json_str)
         except:
@@ -485,37 +594,43 @@ class TelegramBotServer(QThread):
                 
         return text
 
+    @staticmethod
+    def format_log_fields(table, fields):
+        """Строка журнала по типизированным полям; None — если нужен JSON (не заполнены, списание и пр.)"""
+        t, pname, qty, total, cat = fields
+        if t is None and total is None and cat is None:
+            return None  # запись еще не перенесена backfill() или из архива до миграции
+        num = lambda v: int(v) if v is not None and v == int(v) else v
+        pname = pname or "?"
+        if t == "продажа" and total is not None:
+            return f"Продажа: {pname} ({num(qty)} шт) = {total:.0f}р"
+        if t == "выдача_приза" and total is not None:
+            return f"Приз: {pname} ({num(qty)} шт) = {total:.0f} тик"
+        if t == "приход":
+            return f"Приход: {pname} ({num(qty)})"
+        if table == "cash_transactions" and t not in ("продажа", "списание", "выдача_приза", "приход"):
+            return f"Касса: {cat or '?'} {total or 0:.0f}р"
+        return None
+
     # --- ОТЧЕТЫ И ИНФО ---
 
     def send_status(self, chat_id):
         """УЛУЧШЕННЫЙ СТАТУС с реальной информацией о системе"""
-        today = datetime.date.today()
-        today_str = today.strftime("%Y-%m-%d")
+        # 1-5, 7-8. Все показатели из БД — одним снимком (кэш на несколько секунд)
+        snap = self.status.get()
         
-        cur = self.db.conn.cursor()
-        
-        # 1. Баланс главной кассы
-        balance_data = self.db.get_cash_balance_breakdown()
+        balance_data = snap['balance']
         cash_balance = balance_data['cash']
         card_balance = balance_data.get('cashless', 0) # <-- ИСПРАВЛЕНО
         
-        # 2. События сегодня
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE event_date = ?", (today_str,))
-        events_today = cur.fetchone()[0]
-        
-        # 3. Выручка бара сегодня
-        cur.execute("SELECT COUNT(*), SUM(total) FROM stock_moves WHERE move_type='продажа' AND date=?", (today_str,))
-        bar_sales_count, bar_sales_total = cur.fetchone()
-        bar_sales_total = bar_sales_total or 0
-        
-        # 4. Призы выданы сегодня
-        cur.execute("SELECT COUNT(*), SUM(total) FROM stock_moves WHERE move_type='выдача_приза' AND date=?", (today_str,))
-        prizes_count, prizes_tickets = cur.fetchone()
-        prizes_tickets = prizes_tickets or 0
+        events_today = snap['events_today']
+        events_tomorrow = snap['events_tomorrow']
+        bar_sales_count, bar_sales_total = snap['bar_sales_count'], snap['bar_sales_total']
+        prizes_count, prizes_tickets = snap['prizes_count'], snap['prizes_tickets']
+        total_bookings, total_moves, total_products = snap['total_bookings'], snap['total_moves'], snap['total_products']
         
-        # 5. Последняя активность
-        cur.execute("SELECT MAX(timestamp) FROM user_actions_log")
-        last_activity = cur.fetchone()[0]
+        # Последняя активность
+        last_activity = snap['last_activity']
         if last_activity:
             last_time = datetime.datetime.strptime(last_activity, "%Y-%m-%d %H:%M:%S")
             minutes_ago = int((datetime.datetime.now() - last_time).total_seconds() / 60)
@@ -537,18 +652,9 @@ class TelegramBotServer(QThread):
         else:
             db_size_text = "?"
         
-        # 7. Количество записей
-        cur.execute("SELECT COUNT(*) FROM bookings")
-        total_bookings = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM stock_moves")
-        total_moves = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM products")
-        total_products = cur.fetchone()[0]
-        
-        # 8. События завтра
-        tomorrow = today + datetime.timedelta(days=1)
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE event_date = ?", (tomorrow.strftime("%Y-%m-%d"),))
-        events_tomorrow = cur.fetchone()[0]
+        # 9. Задержка Telegram API (по счетчикам транспорта)
+        api_stats = self.transport.stats().get("sendMessage")
+        api_text = f"{api_stats['avg_ms']:.0f} мс (макс {api_stats['max_ms']:.0f})" if api_stats else "нет данных"
         
         msg = f"""🔥 <b>СТАТУС СИСТЕМЫ УЛЕЙ (v{CURRENT_VERSION})</b>
 {"="*30}
@@ -583,17 +689,26 @@ class TelegramBotServer(QThread):
 ⏰ <b>АКТИВНОСТЬ:</b>
 🕐 Последнее действие: {activity_text}
 ✅ Бот: <b>РАБОТАЕТ</b>
-🟢 Связь с БД: <b>ОК</b>"""
+🟢 Связь с БД: <b>ОК</b>
+📡 Telegram API: {api_text}"""
         
         self.send_message(chat_id, msg)
 
     def send_database_file(self, chat_id):
         self.send_message(chat_id, "⏳ Подготовка файла базы данных...")
         db_path = "bar_uley.db"
-        if os.path.exists(db_path):
-            self.send_document(chat_id, db_path, "backup.db")
-        else:
+        if not os.path.exists(db_path):
             self.send_message(chat_id, "❌ Файл базы данных не найден на диске.")
+            return
+        
+        # Согласованный снимок (с учетом WAL) в gzip; повторно — из кэша, если база не менялась
+        try:
+            snapshot_path = get_snapshot(db_path).get_compressed()
+        except Exception as e:
+            self.send_message(chat_id, f"❌ Не удалось сделать снимок БД: {e}")
+            return
+        filename = f"backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.db.gz"
+        self.send_document(chat_id, snapshot_path, filename)
 
     def send_upcoming_birthdays(self, chat_id):
         """Отправка списка ближайших дней рождения (праздников)"""
@@ -602,13 +717,7 @@ class TelegramBotServer(QThread):
         end_date = today + datetime.timedelta(days=14)
         
         cur = self.db.conn.cursor()
-        cur.execute("""
-            SELECT event_date, event_time, client_name, room_name, package_name, 
-                   animator_hero, child_count, phone, age, total_price, status
-            FROM bookings 
-            WHERE event_date >= ? AND event_date <= ?
-            ORDER BY event_date, event_time
-        """, (today.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
+        cur.execute(BOT_BANQUETS_RANGE, (today.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
         
         events = cur.fetchall()
         
@@ -698,9 +807,8 @@ class TelegramBotServer(QThread):
         
         cur = self.db.conn.cursor()
         
-        # 1. ГЛАВНАЯ КАССА
-        cur.execute("SELECT operation_type, payment_type, category, amount, description FROM cash_transactions WHERE date = ?", (date_str,))
-        rows = cur.fetchall()
+        # 1. ГЛАВНАЯ КАССА (дневные агрегаты daily_cash_rollup)
+        rows = self.rollup.fetch_cash(date_str, date_str)
         
         if not rows:
             self.send_message(chat_id, f"📅 За <b>{human_date}</b> данных нет.")
@@ -714,8 +822,7 @@ class TelegramBotServer(QThread):
         lab_hour = 0; lab_unlim = 0
         banquet_income = 0  # ДОБАВЛЕНО: Доход по банкетам
         
-        for op_type, pay_type, category, amount, desc in rows:
-            amount = amount or 0
+        for _date, op_type, pay_type, category, amount, hours, unlim in rows:
             cat_key = category or "Прочее"
             
             if op_type == 'income':
@@ -731,12 +838,9 @@ class TelegramBotServer(QThread):
                 else: exp_card += amount
                 exp_by_cat[cat_key] = exp_by_cat.get(cat_key, 0) + amount
             
-            # Парсинг детей
-            if desc and "Лабиринт" in (category or ""):
-                m_h = re.search(r"Час:\s*(\d+)", desc)
-                m_u = re.search(r"Безлим:\s*(\d+)", desc)
-                if m_h: lab_hour += int(m_h.group(1))
-                if m_u: lab_unlim += int(m_u.group(1))
+            # Дети лабиринта (уже разобраны из описаний при записи)
+            lab_hour += hours
+            lab_unlim += unlim
         
         lab_hour //= 2
         lab_unlim //= 2
@@ -747,42 +851,23 @@ class TelegramBotServer(QThread):
         net_cash = inc_cash - exp_cash
         
         # 2. БАР
-        cur.execute("""
-            SELECT p.category, p.name, SUM(m.qty), SUM(m.total), COUNT(*)
-            FROM stock_moves m
-            JOIN products p ON m.product_id = p.id
-            WHERE m.move_type = 'продажа' AND m.date = ?
-            GROUP BY p.category, p.name
-            ORDER BY SUM(m.total) DESC
-            LIMIT 10
-        """, (date_str,))
+        cur.execute(BOT_TOP_SALES_DAY, (date_str,))
         top_sales = cur.fetchall()
         
-        cur.execute("SELECT COUNT(*), SUM(total) FROM stock_moves WHERE move_type='продажа' AND date=?", (date_str,))
-        bar_count, bar_total = cur.fetchone()
-        bar_total = bar_total or 0
+        day_totals = self.rollup.fetch_totals(date_str, date_str)
+        bar_count, bar_total = day_totals['bar_count'], day_totals['bar_total']
         
         # 3. ПРИЗОТЕКА
-        cur.execute("SELECT SUM(qty), SUM(total) FROM stock_moves WHERE move_type='выдача_приза' AND date=?", (date_str,))
-        prizes_qty, prizes_tickets = cur.fetchone()
-        prizes_qty = prizes_qty or 0
-        prizes_tickets = prizes_tickets or 0
+        prizes_qty, prizes_tickets = day_totals['prizes_qty'], day_totals['prizes_tickets']
         
         # 4. БАНКЕТЫ
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE event_date=?", (date_str,))
-        banquets_count = cur.fetchone()[0]
+        banquets_count = day_totals['banquets_count']
         
-        cur.execute("SELECT client_name, event_time, room_name, child_count FROM bookings WHERE event_date=? ORDER BY event_time", (date_str,))
+        cur.execute(BOT_BANQUETS_DAY, (date_str,))
         banquets_list = cur.fetchall()
         
         # 5. СПИСАНИЯ В СЧЕТ ЗП
-        cur.execute("""
-            SELECT m.salary_person, SUM(m.qty * p.retail_price), COUNT(*)
-            FROM stock_moves m
-            JOIN products p ON m.product_id = p.id
-            WHERE m.move_type = 'списание' AND m.writeoff_type = 'в счёт ЗП' AND m.date = ?
-            GROUP BY m.salary_person
-        """, (date_str,))
+        cur.execute(BOT_SALARY_WRITEOFFS, (date_str,))
         salary_writeoffs = cur.fetchall()
         
         # ФОРМИРУЕМ СООБЩЕНИЕ
@@ -871,16 +956,11 @@ class TelegramBotServer(QThread):
         end_date = datetime.date.today()
         start_date = end_date - datetime.timedelta(days=days-1)
         
+        d1, d2 = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
         cur = self.db.conn.cursor()
         
-        # 1. ФИНАНСЫ
-        cur.execute("""
-            SELECT operation_type, amount, description, category, date
-            FROM cash_transactions 
-            WHERE date >= ? AND date <= ?
-        """, (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
-        
-        rows = cur.fetchall()
+        # 1. ФИНАНСЫ (дневные агрегаты вместо перебора всех операций)
+        rows = self.rollup.fetch_cash(d1, d2)
         
         total_inc = 0; total_exp = 0
         daily_income = {}
@@ -888,9 +968,7 @@ class TelegramBotServer(QThread):
         lab_hour_total = 0; lab_unlim_total = 0
         top_expense = {}
         
-        for op_type, amount, desc, cat, date in rows:
-            amount = amount or 0
-            
+        for date, op_type, _pay, cat, amount, hours, unlim in rows:
             if op_type == 'income':
                 total_inc += amount
                 daily_income[date] = daily_income.get(date, 0) + amount
@@ -900,56 +978,28 @@ class TelegramBotServer(QThread):
                 if cat: top_expense[cat] = top_expense.get(cat, 0) + amount
             
             # Дети
-            if desc and "Лабиринт" in (cat or ""):
-                m_h = re.search(r"Час:\s*(\d+)", desc)
-                m_u = re.search(r"Безлим:\s*(\d+)", desc)
-                if m_h: lab_hour_total += int(m_h.group(1))
-                if m_u: lab_unlim_total += int(m_u.group(1))
+            lab_hour_total += hours
+            lab_unlim_total += unlim
         
         lab_hour_total //= 2
         lab_unlim_total //= 2
         profit = total_inc - total_exp
         
         # 2. БАР
-        cur.execute("""
-            SELECT SUM(total), COUNT(*)
-            FROM stock_moves 
-            WHERE move_type='продажа' AND date >= ? AND date <= ?
-        """, (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
-        bar_total, bar_count = cur.fetchone()
-        bar_total = bar_total or 0
+        totals = self.rollup.fetch_totals(d1, d2)
+        bar_total, bar_count = totals['bar_total'], totals['bar_count']
         
         # Топ продажи
-        cur.execute("""
-            SELECT p.name, SUM(m.total), SUM(m.qty)
-            FROM stock_moves m
-            JOIN products p ON m.product_id = p.id
-            WHERE m.move_type = 'продажа' AND m.date >= ? AND m.date <= ?
-            GROUP BY p.name
-            ORDER BY SUM(m.total) DESC
-            LIMIT 5
-        """, (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
+        cur.execute(BOT_TOP_SALES_PERIOD, (d1, d2))
         top_products = cur.fetchall()
         
         # 3. БАНКЕТЫ
-        cur.execute("""
-            SELECT COUNT(*), SUM(total_price), SUM(child_count)
-            FROM bookings 
-            WHERE event_date >= ? AND event_date <= ?
-        """, (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
-        banquet_count, banquet_revenue, banquet_children = cur.fetchone()
-        banquet_revenue = banquet_revenue or 0
-        banquet_children = banquet_children or 0
+        banquet_count = totals['banquets_count']
+        banquet_revenue = totals['banquets_revenue']
+        banquet_children = totals['banquets_children']
         
         # 4. ПРИЗЫ
-        cur.execute("""
-            SELECT SUM(qty), SUM(total)
-            FROM stock_moves 
-            WHERE move_type='выдача_приза' AND date >= ? AND date <= ?
-        """, (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")))
-        prizes_qty, prizes_tickets = cur.fetchone()
-        prizes_qty = prizes_qty or 0
-        prizes_tickets = prizes_tickets or 0
+        prizes_qty, prizes_tickets = totals['prizes_qty'], totals['prizes_tickets']
         
         # ЛУЧШИЙ/ХУДШИЙ ДЕНЬ
         best_day = max(daily_income.items(), key=lambda x: x[1]) if daily_income else (None, 0)
@@ -1,10 +1,15 @@
-import urllib.request
-import json
-import time
 import os
-import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt6.QtCore import QThread, pyqtSignal
 from core.settings import TG_BOT_TOKEN, TG_CHAT_ID
+from services.tg_transport import get_transport, get_rate_limiter, MultipartBody
+from database.db_snapshot import get_snapshot
+
+# Одновременных отправок (дальше упираемся в лимиты Telegram, а не в сеть)
+MAX_WORKERS = 8
+# Повторов после ответа 429 Too Many Requests
+MAX_RETRIES = 3
 
 class TelegramSender(QThread):
     """
@@ -27,8 +32,12 @@ class TelegramSender(QThread):
         else:
             self.recipients = []
             
-        self.api_url_msg = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage"
-        self.api_url_doc = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendDocument"
+        self.transport = get_transport()  # Общий пул keep-alive соединений
+        self.limiter = get_rate_limiter()
+        self.results = {}  # {chat_id: (успех, текст ошибки)} — заполняется в run()
+        # Каждый файл грузим в Telegram один раз, остальным шлем его file_id
+        self.file_ids = {}  # {путь: file_id}
+        self.file_locks = {}
 
     def run(self):
         # Базовая проверка токена
@@ -36,97 +45,103 @@ class TelegramSender(QThread):
             self.finished_signal.emit(False, "Ошибка: Не настроен TG_BOT_TOKEN в settings.py")
             return
 
-        if not self.recipients:
+        recipients = [chat_id for chat_id in self.recipients if chat_id]
+        if not recipients:
             self.finished_signal.emit(False, "Ошибка: Нет получателей (база пуста и TG_CHAT_ID не задан)")
             return
 
-        success_count = 0
-        errors = []
+        # Файл БД заменяем согласованным сжатым снимком (живой файл в WAL-режиме неполон)
+        try:
+            self.files = [self.prepare_file(path) for path in self.files]
+        except Exception as e:
+            self.finished_signal.emit(False, f"Ошибка подготовки снимка БД: {e}")
+            return
+        self.file_locks = {path: threading.Lock() for path in self.files}
+
+        # Рассылка параллельно (ограниченным пулом потоков); темп задает RateLimiter
+        self.results = {}
+        workers = min(MAX_WORKERS, len(recipients))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.send_to_recipient, chat_id): chat_id for chat_id in recipients}
+            for future in as_completed(futures):
+                chat_id = futures[future]
+                try:
+                    future.result()
+                    self.results[chat_id] = (True, "")
+                except Exception as e:
+                    self.results[chat_id] = (False, str(e))
 
-        # Проходим по всем получателям
-        for chat_id in self.recipients:
-            if not chat_id: continue
-            
-            try:
-                # 1. Отправка текста
-                data = {
-                    "chat_id": chat_id,
-                    "text": self.message_text,
-                    "parse_mode": "HTML"
-                }
-                
-                json_data = json.dumps(data).encode('utf-8')
-                
-                req = urllib.request.Request(
-                    self.api_url_msg, 
-                    data=json_data, 
-                    headers={'Content-Type': 'application/json', 'User-Agent': 'BarUleyApp/3.0'}
-                )
-                
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status == 200:
-                        success_count += 1
-                    else:
-                        errors.append(f"Msg ID {chat_id}: код {response.status}")
-                
-                # 2. Отправка файлов (если есть)
-                for file_path in self.files:
-                    if os.path.exists(file_path):
-                        self.send_file(chat_id, file_path)
-                        time.sleep(1) # Пауза для тяжелых файлов
-                
-                # Пауза 0.3 сек между пользователями
-                time.sleep(0.3)
-                
-            except Exception as e:
-                errors.append(f"ID {chat_id}: {str(e)}")
-
-        # Формируем итоговый отчет о рассылке
-        if success_count > 0:
-            msg = f"Отправлено: {success_count} из {len(self.recipients)} сотр."
+        success_ids = [cid for cid, (ok, _) in self.results.items() if ok]
+        errors = [f"ID {cid}: {err}" for cid, (ok, err) in self.results.items() if not ok]
+
+        # Формируем итоговый отчет о рассылке (с разбивкой по получателям)
+        if success_ids:
+            msg = f"Отправлено: {len(success_ids)} из {len(recipients)} сотр."
             if self.files:
                 msg += f" (+БД)"
-            if errors: msg += f" (Ошибки: {len(errors)})"
+            if errors: msg += f" (Ошибки: {len(errors)}: {'; '.join(errors[:3])})"
             self.finished_signal.emit(True, msg)
         else:
             self.finished_signal.emit(False, f"Сбой рассылки: {'; '.join(errors[:3])}...")
 
-    def send_file(self, chat_id, file_path):
-        """Отправка файла через multipart/form-data"""
-        boundary = uuid.uuid4().hex
-        filename = os.path.basename(file_path)
-        
-        data = []
-        # chat_id
-        data.append(f'--{boundary}'.encode('utf-8'))
-        data.append(f'Content-Disposition: form-data; name="chat_id"'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        data.append(str(chat_id).encode('utf-8'))
-        
-        # file
-        data.append(f'--{boundary}'.encode('utf-8'))
-        data.append(f'Content-Disposition: form-data; name="document"; filename="{filename}"'.encode('utf-8'))
-        data.append('Content-Type: application/octet-stream'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        
-        with open(file_path, 'rb') as f:
-            data.append(f.read())
-            
-        data.append(f'--{boundary}--'.encode('utf-8'))
-        data.append(''.encode('utf-8'))
-        
-        body = b'\r\n'.join(data)
-        headers = {
-            'Content-Type': f'multipart/form-data; boundary={boundary}',
-            'Content-Length': str(len(body)),
-            'User-Agent': 'BarUleyApp/3.0'
+    def prepare_file(self, file_path):
+        if file_path.lower().endswith(".db") and os.path.exists(file_path):
+            return get_snapshot(file_path).get_compressed()
+        return file_path
+
+    def send_to_recipient(self, chat_id):
+        """Текст + файлы одному получателю. Исключение = ошибка для этого получателя."""
+        data = {
+            "chat_id": chat_id,
+            "text": self.message_text,
+            "parse_mode": "HTML"
         }
-        
-        try:
-            req = urllib.request.Request(self.api_url_doc, data=body, headers=headers, method='POST')
-            urllib.request.urlopen(req, timeout=60)
-        except Exception as e:
-            print(f"File send error: {e}")
+        self.api_request(chat_id, "sendMessage", lambda: self.transport.call("sendMessage", data, timeout=10))
+
+        for file_path in self.files:
+            if os.path.exists(file_path):
+                self.deliver_file(chat_id, file_path)
+
+    def deliver_file(self, chat_id, file_path):
+        """
+        Первый получатель загружает файл целиком и сохраняет file_id,
+        остальные (ожидая на блокировке файла) получают его по file_id — без повторной загрузки.
+        """
+        with self.file_locks[file_path]:
+            file_id = self.file_ids.get(file_path)
+            if file_id is None:
+                res = self.send_file(chat_id, file_path)
+                document = ((res or {}).get("result") or {}).get("document") or {}
+                if document.get("file_id"):
+                    self.file_ids[file_path] = document["file_id"]
+                return
+
+        data = {"chat_id": chat_id, "document": file_id}
+        self.api_request(chat_id, "sendDocument", lambda: self.transport.call("sendDocument", data, timeout=10))
+
+    def api_request(self, chat_id, method, do_request):
+        """
+        Выполняет запрос с учетом лимитов Telegram.
+        На 429 ждет retry_after (из ответа) и повторяет, не более MAX_RETRIES раз.
+        """
+        for _attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire(chat_id)
+            status, res = do_request()
+            if status == 200:
+                return res
+            if status == 429 and res:
+                retry_after = (res.get("parameters") or {}).get("retry_after", 1)
+                self.limiter.penalize(chat_id, retry_after)
+                continue
+            description = res.get("description", "") if res else ""
+            raise RuntimeError(f"{method}: код {status} {description}".strip())
+        raise RuntimeError(f"{method}: превышен лимит Telegram (429)")
+
+    def send_file(self, chat_id, file_path):
+        """Загрузка файла через multipart/form-data. Возвращает ответ API (с file_id)."""
+        body = MultipartBody({"chat_id": chat_id}, "document", os.path.basename(file_path), file_path)
+        return self.api_request(chat_id, "sendDocument",
+                                lambda: self.transport.request("sendDocument", body, body.headers, timeout=60))
 
 def send_telegram_sync(text, recipients=None):
     """
@@ -136,12 +151,10 @@ def send_telegram_sync(text, recipients=None):
     
     targets = recipients if recipients else ([TG_CHAT_ID] if TG_CHAT_ID else [])
     
+    transport = get_transport()
     for chat_id in targets:
         try:
-            url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage"
-            data = json.dumps({"chat_id": chat_id, "text": text, "parse_mode": "HTML"}).encode('utf-8')
-            req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-            urllib.request.urlopen(req, timeout=5)
+            transport.call("sendMessage", {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}, timeout=5)
         except:
             pass
     return True
\ No newline at end of file
@@ -0,0 +1,303 @@
+import http.client
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+import uuid
+from core.settings import TG_BOT_TOKEN
+
+TG_API_HOST = "api.telegram.org"
+USER_AGENT = "BarUleyApp/3.0"
+
+# Лимиты Bot API: ~30 сообщений/сек всего и ~1 сообщение/сек в один чат
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+
+# Ошибки, при которых keep-alive соединение считаем "протухшим" (сервер закрыл его
+# по простою) и повторяем запрос один раз через новое соединение.
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                 http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+
+class TelegramTransport:
+    """
+    Общий HTTPS-транспорт для всех запросов к Telegram Bot API.
+    - Пул keep-alive соединений (без TCP+TLS рукопожатия на каждое сообщение).
+    - Потокобезопасен: каждый поток берет из пула свое соединение.
+    - Переподключение при обрыве соединения.
+    - Счетчики задержек по методам API (см. stats()).
+    - abort(method) обрывает выполняющиеся запросы метода (long polling при остановке бота).
+    """
+
+    def __init__(self, token, max_idle=8):
+        self.token = token
+        self.max_idle = max_idle
+        self._ssl_context = ssl.create_default_context()
+        self._idle = []  # Свободные соединения (LIFO: самое "теплое" сверху)
+        self._lock = threading.Lock()
+        self._stats = {}  # {method: {"count", "errors", "total_ms", "max_ms"}}
+        self._in_flight = {}  # {соединение: метод} — запросы, выполняющиеся сейчас
+
+    # --- ПУЛ СОЕДИНЕНИЙ ---
+
+    def _new_connection(self, timeout):
+        return http.client.HTTPSConnection(TG_API_HOST, timeout=timeout, context=self._ssl_context)
+
+    def _acquire(self, timeout):
+        """Возвращает (соединение, взято_из_пула)"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _track(self, conn, method):
+        conn.aborted = False
+        with self._lock:
+            self._in_flight[conn] = method
+
+    def _untrack(self, conn):
+        with self._lock:
+            self._in_flight.pop(conn, None)
+
+    def abort(self, method):
+        """
+        Обрывает выполняющиеся запросы метода method из другого потока: сокет закрывается
+        на чтение/запись, ожидающий ответа request() сразу получает ошибку (без повтора).
+        """
+        with self._lock:
+            conns = [c for c, m in self._in_flight.items() if m == method]
+        for conn in conns:
+            conn.aborted = True
+            sock = conn.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    # --- ЗАПРОСЫ ---
+
+    def request(self, method, body=None, headers=None, timeout=10):
+        """
+        POST/GET запрос к методу Bot API.
+        Возвращает (http_status, json_ответ). Сетевые ошибки пробрасываются наружу.
+        """
+        path = f"/bot{self.token}/{method}"
+        hdrs = {"User-Agent": USER_AGENT, "Connection": "keep-alive"}
+        if headers:
+            hdrs.update(headers)
+        http_method = "POST" if body is not None else "GET"
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            conn, reused = self._acquire(timeout)
+            self._track(conn, method)
+            try:
+                status, raw = self._send(conn, http_method, path, body, hdrs)
+            except _STALE_ERRORS:
+                self._untrack(conn)
+                conn.close()
+                if not reused or conn.aborted:
+                    raise
+                # Старое соединение закрыто сервером — пробуем один раз через новое
+                conn = self._new_connection(timeout)
+                self._track(conn, method)
+                try:
+                    status, raw = self._send(conn, http_method, path, body, hdrs)
+                except Exception:
+                    self._untrack(conn)
+                    conn.close()
+                    raise
+            except Exception:
+                self._untrack(conn)
+                conn.close()
+                raise
+            self._untrack(conn)
+            if conn.aborted:
+                # Ответ успел прийти, но соединение уже оборвано — в пул не возвращаем
+                conn.close()
+            else:
+                self._release(conn)
+            ok = True
+            try:
+                data = json.loads(raw.decode("utf-8")) if raw else None
+            except ValueError:
+                data = None
+            return status, data
+        finally:
+            self._record(method, (time.perf_counter() - started) * 1000, ok)
+
+    def _send(self, conn, http_method, path, body, headers):
+        conn.request(http_method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        raw = response.read()
+        if response.will_close:
+            conn.close()  # Следующий запрос на этом объекте откроет новое соединение
+        return response.status, raw
+
+    def call(self, method, params=None, timeout=10):
+        """JSON-вызов метода API. Возвращает (http_status, json_ответ)."""
+        body = None
+        headers = None
+        if params is not None:
+            body = json.dumps(params).encode("utf-8")
+            headers = {"Content-Type": "application/json"}
+        return self.request(method, body, headers, timeout)
+
+    # --- СТАТИСТИКА ---
+
+    def _record(self, method, elapsed_ms, ok):
+        with self._lock:
+            st = self._stats.setdefault(method, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            st["count"] += 1
+            if not ok:
+                st["errors"] += 1
+            st["total_ms"] += elapsed_ms
+            st["max_ms"] = max(st["max_ms"], elapsed_ms)
+
+    def stats(self):
+        """Снимок счетчиков: {method: {count, errors, avg_ms, max_ms}}"""
+        with self._lock:
+            return {
+                m: {
+                    "count": st["count"],
+                    "errors": st["errors"],
+                    "avg_ms": round(st["total_ms"] / st["count"], 1) if st["count"] else 0.0,
+                    "max_ms": round(st["max_ms"], 1),
+                }
+                for m, st in self._stats.items()
+            }
+
+
+class MultipartBody:
+    """
+    Потоковое тело multipart/form-data для загрузки файла.
+    Файл читается кусками по CHUNK_SIZE прямо в сокет, Content-Length известен заранее —
+    в памяти никогда не лежит копия файла. Объект можно итерировать повторно (для ретраев).
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fields, file_field, filename, source):
+        """
+        fields — обычные поля формы {имя: значение};
+        source — путь к файлу на диске или bytes в памяти.
+        """
+        boundary = uuid.uuid4().hex
+        head = []
+        for name, value in fields.items():
+            head.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        head.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n')
+        self._head = "".join(head).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self.source = source
+        self.file_size = len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.content_length = len(self._head) + self.file_size + len(self._tail)
+
+    @property
+    def headers(self):
+        return {"Content-Type": self.content_type, "Content-Length": str(self.content_length)}
+
+    def __iter__(self):
+        yield self._head
+        if isinstance(self.source, (bytes, bytearray)):
+            view = memoryview(self.source)
+            for pos in range(0, self.file_size, self.CHUNK_SIZE):
+                yield view[pos:pos + self.CHUNK_SIZE]
+        else:
+            # Читаем ровно file_size байт: Content-Length уже отправлен в заголовке
+            remaining = self.file_size
+            with open(self.source, "rb") as f:
+                while remaining > 0:
+                    chunk = f.read(min(self.CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise IOError(f"Файл {self.source} уменьшился во время отправки")
+                    remaining -= len(chunk)
+                    yield chunk
+        yield self._tail
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов к Bot API.
+    Глобальный token bucket (rate запросов/сек) + минимальный интервал на чат.
+    """
+
+    def __init__(self, rate=GLOBAL_RATE, per_chat_interval=PER_CHAT_INTERVAL):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._chat_next = {}  # {chat_id: monotonic-время, раньше которого писать нельзя}
+        self._lock = threading.Lock()
+
+    def acquire(self, chat_id=None):
+        """Блокирует поток, пока запрос в chat_id не станет разрешен лимитами."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                wait = 0.0
+                if chat_id is not None:
+                    wait = self._chat_next.get(str(chat_id), 0.0) - now
+                if self._tokens < 1:
+                    wait = max(wait, (1 - self._tokens) / self.rate)
+
+                if wait <= 0:
+                    self._tokens -= 1
+                    if chat_id is not None:
+                        self._chat_next[str(chat_id)] = now + self.per_chat_interval
+                    return
+            time.sleep(wait)
+
+    def penalize(self, chat_id, retry_after):
+        """Ответ 429: не писать в chat_id еще retry_after секунд."""
+        with self._lock:
+            until = time.monotonic() + retry_after
+            key = str(chat_id)
+            self._chat_next[key] = max(self._chat_next.get(key, 0.0), until)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+_rate_limiter = None
+
+def get_rate_limiter():
+    """Единый ограничитель на процесс (лимиты Telegram считаются на бота, а не на поток)."""
+    global _rate_limiter
+    with _transport_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+def get_transport():
+    """Единый транспорт на процесс (бот + рассылки используют общий пул)."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = TelegramTransport(TG_BOT_TOKEN)
+        return _transport
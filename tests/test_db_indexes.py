@@ -0,0 +1,55 @@
+import sqlite3
+import types
+
+import pytest
+
+from database.db_indexes import HOT_INDEXES, HOT_QUERIES, check_plans, ensure_indexes
+from database.db_migrations import migrate
+
+# Минимальная схема: только колонки, которые читают горячие запросы
+SCHEMA = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, uom TEXT, type TEXT,
+                       retail_price REAL);
+CREATE TABLE stock_moves (id INTEGER PRIMARY KEY, date TEXT, product_id INTEGER, qty REAL,
+                          unit_price REAL, total REAL, move_type TEXT, writeoff_type TEXT,
+                          salary_person TEXT, payment_type TEXT, employee TEXT, comment TEXT);
+CREATE TABLE cash_transactions (id INTEGER PRIMARY KEY, date TEXT, amount REAL);
+CREATE TABLE bookings (id INTEGER PRIMARY KEY, client_name TEXT, event_date TEXT, event_time TEXT,
+                       room_name TEXT, package_name TEXT, animator_hero TEXT, child_count INTEGER,
+                       phone TEXT, age INTEGER, total_price REAL, status TEXT);
+"""
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO products (name, uom, type, retail_price) VALUES (?, 'шт', 'товар', ?)",
+                     [(f"Товар {i}", 100 + i) for i in range(20)])
+    moves = [(f"2024-{m:02d}-{d:02d}", 1 + (m * d) % 20, 1, 100, 100, t)
+             for m in range(1, 13) for d in range(1, 29) for t in ("продажа", "списание", "приход")]
+    conn.executemany("INSERT INTO stock_moves (date, product_id, qty, unit_price, total, move_type) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", moves)
+    conn.executemany("INSERT INTO bookings (client_name, event_date, event_time) VALUES (?, ?, '12:00')",
+                     [(f"Клиент {i}", f"2024-03-{1 + i % 28:02d}") for i in range(50)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_hot_queries_use_indexes(conn):
+    ensure_indexes(conn)
+    assert check_plans(conn) == []
+
+
+def test_check_plans_reports_missing_index(conn):
+    ensure_indexes(conn)
+    conn.execute("DROP INDEX idx_bookings_event_date")
+    problems = check_plans(conn, {"bot_banquets_day": HOT_QUERIES["bot_banquets_day"]})
+    assert [name for name, _ in problems] == ["bot_banquets_day"]
+
+
+def test_migrate_creates_indexes(conn):
+    migrate(types.SimpleNamespace(conn=conn))
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {name for name, _, _ in HOT_INDEXES} <= names
@@ -7,8 +7,7 @@ from PyQt6.QtCore import Qt, QDate
 
 from database.db_manager import DatabaseManager
 from core.utils import CurrentUser, format_quantity_display
-import webbrowser
-import os
+from services.report_worker import get_report_queue
 import json
 
 class CashierReportTab(QWidget):
@@ -74,7 +73,7 @@ class CashierReportTab(QWidget):
         self.writeoff_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.writeoff_table)
         
-        btn_z = QPushButton("🖨️ Закрыть смену / Z-отчет")
+        self.btn_z = btn_z = QPushButton("🖨️ Закрыть смену / Z-отчет")
         btn_z.setMinimumHeight(60)
         btn_z.setStyleSheet("background-color: #2196F3; color: white; font-size: 16px; font-weight: bold; border-radius: 8px;")
         btn_z.clicked.connect(self.print_z_report)
@@ -134,30 +133,33 @@ class CashierReportTab(QWidget):
 
     def open_salary_report(self):
         d = QDate.currentDate()
-        html = self.db.build_salary_report_html(d, d)
-        
-        os.makedirs("reports", exist_ok=True)
         fn = f"reports/salary_report_SHIFT_{d.toString('yyyyMMdd')}.html"
-        
-        try:
-            with open(fn, "w", encoding="utf-8") as f: f.write(html)
-            webbrowser.open(os.path.abspath(fn))
-            self.db.log_action(self.current_user.id, "create", "reports", None, None, 
-                               json.dumps({"action": "salary_report_generated", "date": d.toString("yyyy-MM-dd")}, ensure_ascii=False))
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Не удалось открыть отчет:\n{e}")
+        # Отчет строится в фоне (свое соединение с БД), касса не замирает
+        get_report_queue().submit(self.db, lambda db: db.build_salary_report_html(d, d), fn,
+                                  on_done=lambda ok, path, err: self._on_salary_report_done(ok, err, d))
+
+    def _on_salary_report_done(self, ok, err, d):
+        if not ok:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось открыть отчет:\n{err}")
+            return
+        self.db.log_action(self.current_user.id, "create", "reports", None, None, 
+                           json.dumps({"action": "salary_report_generated", "date": d.toString("yyyy-MM-dd")}, ensure_ascii=False))
 
     def print_z_report(self):
         d = QDate.currentDate()
+        fn = f"reports/z_report_{d.toString('yyyyMMdd')}.html"
+        self.btn_z.setEnabled(False)  # Повторное нажатие, пока отчет строится, не закроет смену дважды
+        get_report_queue().submit(self.db, lambda db: db.build_daily_report_html(d), fn,
+                                  on_done=lambda ok, path, err: self._on_z_report_done(ok, err, d))
+
+    def _on_z_report_done(self, ok, err, d):
+        """Продолжение закрытия смены — когда Z-отчет готов (в GUI-потоке)"""
+        self.btn_z.setEnabled(True)
         date_str = d.toString("yyyy-MM-dd")
         
         try:
-            html = self.db.build_daily_report_html(d)
-            os.makedirs("reports", exist_ok=True)
-            fn = f"reports/z_report_{d.toString('yyyyMMdd')}.html"
-            
-            with open(fn, "w", encoding="utf-8") as f: f.write(html)
-            webbrowser.open(os.path.abspath(fn))
+            if not ok:
+                raise RuntimeError(err)
             
             self.db.log_action(self.current_user.id, "create", "reports", None, None, 
                                json.dumps({"action": "z_report_generated", "date": date_str}, ensure_ascii=False))
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QDate
+from PyQt6.QtGui import QColor, QBrush, QTextCharFormat
+
+# Сколько строк журнала подгружается за раз (остальные — при прокрутке)
+PAGE_SIZE = 500
+
+
+class JournalTableModel(QAbstractTableModel):
+    """
+    Модель журнала операций для QTableView (продажи, списания, приходы).
+    Строки хранятся кортежами, а не QTableWidgetItem; подгружаются страницами
+    через fetchMore по мере прокрутки, так что период в год открывается сразу.
+
+    columns — [(заголовок, функция(строка, номер) -> значение)].
+    fetch_page(after, limit) — следующая страница после строки after (None — первая).
+    """
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.rows = []
+        self.fetch_page = None
+        self.page_key = None
+        self.exhausted = True
+
+    def set_source(self, fetch_page, page_key):
+        """Новый источник данных; page_key(строка) -> ключ, после которого читать следующую страницу."""
+        self.beginResetModel()
+        self.rows = []
+        self.fetch_page, self.page_key = fetch_page, page_key
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def set_rows(self, rows):
+        """Готовый список строк (без подгрузки)."""
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.fetch_page, self.exhausted = None, True
+        self.endResetModel()
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return self.value(index.row(), index.column())
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        after = self.page_key(self.rows[-1]) if self.rows else None
+        page = self.fetch_page(after, PAGE_SIZE)
+        if len(page) < PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            start = len(self.rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+    # --- Доступ из вкладок ---
+
+    def value(self, row, column):
+        """Текст ячейки (как item(row, column).text() у QTableWidget)"""
+        v = self.columns[column][1](self.rows[row], row)
+        return "" if v is None else str(v)
+
+
+class CalendarMarker:
+    """
+    Подсветка дат с операциями в QCalendarWidget.
+    Запрашивается только отображаемый месяц (по currentPageChanged), последние
+    просмотренные месяцы помнятся (LRU), так что стоимость не зависит от длины истории.
+
+    fetch_dates(d1, d2) -> даты 'yyyy-MM-dd' с операциями за период.
+    """
+
+    def __init__(self, calendar, fetch_dates, color="#fff2a8", max_months=12):
+        self.calendar = calendar
+        self.fetch_dates = fetch_dates
+        self.max_months = max_months
+        self.months = OrderedDict()  # (год, месяц) -> множество дат
+        self.fmt = QTextCharFormat(); self.fmt.setBackground(QBrush(QColor(color)))
+        calendar.currentPageChanged.connect(self.show_month)
+
+    def reset(self):
+        """Забыть все месяцы и заново подсветить текущий."""
+        self.months.clear()
+        self.calendar.setDateTextFormat(QDate(), QTextCharFormat())  # пустая дата — сброс всех форматов
+        self.show_month(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def show_month(self, year, month):
+        key = (year, month)
+        if key in self.months:
+            self.months.move_to_end(key)
+            return
+        first = QDate(year, month, 1)
+        d1, d2 = first.toString("yyyy-MM-dd"), first.addMonths(1).addDays(-1).toString("yyyy-MM-dd")
+        dates = set(self.fetch_dates(d1, d2))
+        self.months[key] = dates
+        for d in dates:
+            self.calendar.setDateTextFormat(QDate.fromString(d, "yyyy-MM-dd"), self.fmt)
+        if len(self.months) > self.max_months:
+            _, old = self.months.popitem(last=False)
+            for d in old:
+                self.calendar.setDateTextFormat(QDate.fromString(d, "yyyy-MM-dd"), QTextCharFormat())
+
+    def update_dates(self, marked):
+        """Точечное обновление: marked — {дата: есть ли операции}."""
+        for d, on in marked.items():
+            qd = QDate.fromString(d, "yyyy-MM-dd")
+            dates = self.months.get((qd.year(), qd.month()))
+            if dates is None:
+                continue  # месяц не загружен — запросится при показе
+            if on:
+                dates.add(d)
+            else:
+                dates.discard(d)
+            self.calendar.setDateTextFormat(qd, self.fmt if on else QTextCharFormat())
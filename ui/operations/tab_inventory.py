@@ -6,6 +6,9 @@ from PyQt6.QtCore import Qt, QDate
 from PyQt6.QtGui import QColor, QBrush
 
 from database.db_manager import DatabaseManager
+from database.db_stock_batch import StockBatch
+from database.db_stock_balances import StockBalances
+from database.db_migrations import migrate
 from core.utils import CurrentUser
 
 class InventoryTab(QWidget):
@@ -14,6 +17,8 @@ class InventoryTab(QWidget):
         super().__init__()
         self.db = db
         self.current_user = current_user
+        migrate(db)
+        self.balances = StockBalances(db)
         self.init_ui()
     
     def showEvent(self, event):
@@ -44,20 +49,22 @@ class InventoryTab(QWidget):
         self.table.itemChanged.connect(self.on_item_changed)
         layout.addWidget(self.table)
         
+    def stock_rows(self):
+        """[(id, товар, ед., остаток)] — только реальные товары (без призов и техкарт)"""
+        try:
+            # Остатки из stock_balances (их ведут триггеры), а не пересчет всей истории
+            return self.balances.fetch_products("товар")
+        except Exception:
+            # Таблица остатков не создана (миграция не прошла) — прежний полный расчет
+            return [(r[0], r[1], r[2], r[6]) for r in self.db.calc_stock() if not r[8]]
+
     def load_data(self):
         self.table.blockSignals(True)
-        # calc_stock теперь возвращает только товары НЕ ПРИЗЫ
-        rows = self.db.calc_stock()
+        real_products = self.stock_rows()
         self.table.setRowCount(0)
-        
-        # Фильтруем техкарты (инвентаризация только для реальных товаров)
-        real_products = [r for r in rows if not r[8]]
         self.table.setRowCount(len(real_products))
         
-        for r, row in enumerate(real_products):
-            # row: id, name, uom, ..., stock, ...
-            pid, name, uom, stock = row[0], row[1], row[2], row[6]
-            
+        for r, (pid, name, uom, stock) in enumerate(real_products):
             self.table.setItem(r, 0, QTableWidgetItem(str(pid)))
             self.table.setItem(r, 1, QTableWidgetItem(name))
             self.table.setItem(r, 2, QTableWidgetItem(uom))
@@ -100,6 +107,8 @@ class InventoryTab(QWidget):
         date = QDate.currentDate()
         user_id = self.current_user.id
         
+        # Собираем все корректировки и пишем одной транзакцией
+        moves = []
         for r in range(self.table.rowCount()):
             try:
                 pid = int(self.table.item(r, 0).text())
@@ -109,15 +118,19 @@ class InventoryTab(QWidget):
                 
                 if diff < 0:
                     # Недостача -> списание
-                    qty = abs(diff)
-                    self.db.add_stock_move(date, pid, qty, "недостача_инв", 
-                                           comment="Инвентаризация (авто)", writeoff_type="недостача", user_id=user_id)
+                    moves.append({"date": date, "product_id": pid, "qty": abs(diff), "move_type": "недостача_инв",
+                                  "comment": "Инвентаризация (авто)", "writeoff_type": "недостача"})
                 else:
                     # Излишек -> приход
-                    qty = diff
-                    self.db.add_stock_move(date, pid, qty, "излишек_инв", unit_price=0, total=0,
-                                           comment="Инвентаризация (авто)", user_id=user_id)
+                    moves.append({"date": date, "product_id": pid, "qty": diff, "move_type": "излишек_инв",
+                                  "unit_price": 0, "total": 0, "comment": "Инвентаризация (авто)"})
             except: continue
+        
+        try:
+            StockBatch(self.db).bulk_add_stock_moves(moves, user_id=user_id)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Корректировки не сохранены:\n{e}")
+            return
             
         QMessageBox.information(self, "Успех", "Корректировки внесены")
         self.load_data()
\ No newline at end of file
@@ -1,25 +1,50 @@
 import os
-import webbrowser
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, 
     QTableWidget, QTableWidgetItem, QComboBox, QSpinBox, QDateEdit, QMessageBox, 
-    QCheckBox, QHeaderView, QSplitter
+    QCheckBox, QHeaderView, QSplitter, QTableView, QAbstractItemView
 )
 from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QColor, QBrush, QTextCharFormat
 
 from database.db_manager import DatabaseManager
+from database.db_journal import MovesJournal, fetch_move_dates
+from database.db_versions import DataVersions
+from database.db_migrations import migrate
+from ui.operations.operations_shared import JournalTableModel, CalendarMarker
 from core.utils import CurrentUser
+from services.report_worker import get_report_queue
+from services.change_notifier import get_change_notifier
 
 class SalesTab(QWidget):
     """Вкладка ПРОДАЖИ (Админ/Офис)"""
     def __init__(self, db: DatabaseManager, current_user: CurrentUser):
         super().__init__()
         self.db, self.current_user = db, current_user
+        migrate(db)
+        self.versions = DataVersions(db)
+        try:
+            self.versions.watch("products")
+        except Exception as e:
+            print(f"⚠️ Счетчик версий товаров недоступен ({e})")
+        self.products_version = None
+        self.loaded = False
+        self.pending_dates = set()
+        # Изменения продаж (свои и из других окон) приходят пачкой с датами — обновляем только их
+        self.notifier = get_change_notifier(db)
+        self.notifier.changed.connect(self.on_changes)
         self.init_ui()
 
     def showEvent(self, event):
-        self.refresh()
+        if not self.loaded:
+            self.refresh()
+        else:
+            # Полная перезагрузка не нужна: товары — если справочник менялся, остальное — по датам изменений
+            if self.versions.get("products") != self.products_version:
+                self.load_products()
+            self.notifier.notify()
+            if self.pending_dates:
+                self.apply_changes(self.pending_dates)
+                self.pending_dates = set()
         super().showEvent(event)
 
     def init_ui(self):
@@ -30,12 +55,21 @@ class SalesTab(QWidget):
         top_widget = QWidget()
         top_layout = QVBoxLayout(top_widget)
         top_layout.setContentsMargins(0, 0, 0, 0)
-        self.table = QTableWidget()
-        self.table.setColumnCount(11)
-        self.table.setHorizontalHeaderLabels(["ID", "№", "Товар", "Цена", "Кол-во", "Ед", "Сумма", "Оплата", "Сотр", "Комм", "PID"])
+        # Строка: (id, pid, товар, цена, кол-во, ед, сумма, оплата, сотр, комм[, дата])
+        # В режиме периода во второй колонке дата, иначе порядковый номер
+        self.model = JournalTableModel([
+            ("ID", lambda r, i: r[0]),
+            ("№", lambda r, i: r[10] if len(r) > 10 and self.range_check.isChecked() else i + 1),
+            ("Товар", lambda r, i: r[2]), ("Цена", lambda r, i: r[3]), ("Кол-во", lambda r, i: r[4]),
+            ("Ед", lambda r, i: r[5]), ("Сумма", lambda r, i: r[6]), ("Оплата", lambda r, i: r[7]),
+            ("Сотр", lambda r, i: r[8]), ("Комм", lambda r, i: r[9]), ("PID", lambda r, i: r[1]),
+        ], self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setColumnHidden(0, True); self.table.setColumnHidden(10, True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.currentCellChanged.connect(self.on_select)
+        self.table.selectionModel().currentRowChanged.connect(self.on_select)
         top_layout.addWidget(self.table)
         splitter.addWidget(top_widget)
         
@@ -57,6 +91,9 @@ class SalesTab(QWidget):
         self.range_check.toggled.connect(self.toggle_range_mode)
         self.date_edit = QDateEdit(QDate.currentDate()); self.date_edit.setCalendarPopup(True)
         self.date_edit.dateChanged.connect(self.load_data)
+        # Подсветка дат с продажами — только для показанного месяца
+        self.sales_marker = CalendarMarker(self.date_edit.calendarWidget(),
+                                           lambda d1, d2: fetch_move_dates(self.db, "продажа", d1, d2))
         
         self.date_end_edit = QDateEdit(QDate.currentDate()); self.date_end_edit.setCalendarPopup(True)
         self.date_end_edit.dateChanged.connect(self.load_data)
@@ -120,6 +157,17 @@ class SalesTab(QWidget):
         self.load_data()
 
     def refresh(self):
+        self.load_products()
+        self.load_data()
+        self.mark_dates()
+        self.load_rev()
+        if self.current_user.role != "admin":
+            self.emp_edit.setText(self.current_user.full_name)
+        self.loaded = True
+        self.pending_dates = set()
+
+    def load_products(self):
+        self.products_version = self.versions.get("products")
         curr_id = self.prod_box.currentData()
         self.prod_box.blockSignals(True)
         self.prod_box.clear()
@@ -134,35 +182,16 @@ class SalesTab(QWidget):
         self.prod_box.blockSignals(False)
         
         self.on_prod_change()
-        self.load_data()
-        self.mark_dates()
-        self.load_rev()
-        if self.current_user.role != "admin":
-            self.emp_edit.setText(self.current_user.full_name)
 
     def load_data(self):
         d1 = self.date_edit.date().toString("yyyy-MM-dd")
         if self.range_check.isChecked():
             d2 = self.date_end_edit.date().toString("yyyy-MM-dd")
-            rows = self.db.fetch_sales_for_range(d1, d2)
+            # Период может быть длинным: строки подгружаются страницами при прокрутке
+            journal = MovesJournal(self.db, "продажа", d1, d2)
+            self.model.set_source(journal.fetch_page, lambda row: (row[10], row[0]))
         else:
-            rows = self.db.fetch_sales_for_date_full(d1)
-            
-        self.table.setRowCount(len(rows))
-        for r, row in enumerate(rows):
-            mid, pid, name, pr, qty, uom, tot, pay, emp, com = row[:10]
-            self.table.setItem(r, 0, QTableWidgetItem(str(mid)))
-            num_or_date = row[10] if len(row) > 10 else str(r+1)
-            self.table.setItem(r, 1, QTableWidgetItem(str(num_or_date)))
-            self.table.setItem(r, 2, QTableWidgetItem(name))
-            self.table.setItem(r, 3, QTableWidgetItem(str(pr)))
-            self.table.setItem(r, 4, QTableWidgetItem(str(qty)))
-            self.table.setItem(r, 5, QTableWidgetItem(uom))
-            self.table.setItem(r, 6, QTableWidgetItem(str(tot)))
-            self.table.setItem(r, 7, QTableWidgetItem(pay))
-            self.table.setItem(r, 8, QTableWidgetItem(emp))
-            self.table.setItem(r, 9, QTableWidgetItem(com))
-            self.table.setItem(r, 10, QTableWidgetItem(str(pid)))
+            self.model.set_rows(self.db.fetch_sales_for_date_full(d1))
 
     def load_rev(self):
         rows = self.db.fetch_revenue_by_date()
@@ -171,6 +200,45 @@ class SalesTab(QWidget):
             self.rev_table.setItem(r, 0, QTableWidgetItem(d))
             self.rev_table.setItem(r, 1, QTableWidgetItem(str(rev)))
 
+    def on_changes(self, dates, product_ids, move_ids, move_types):
+        if not self.loaded or "продажа" not in move_types:
+            return
+        if not self.isVisible():
+            self.pending_dates |= dates
+            return
+        self.apply_changes(dates)
+
+    def apply_changes(self, dates):
+        """Точечное обновление после изменений продаж за даты dates."""
+        d1 = self.date_edit.date().toString("yyyy-MM-dd")
+        d2 = self.date_end_edit.date().toString("yyyy-MM-dd") if self.range_check.isChecked() else d1
+        if any(d1 <= d <= d2 for d in dates if d):
+            self.load_data()
+        dates = {d for d in dates if d}
+        totals = self.notifier.feed.day_totals("продажа", dates)
+        self.sales_marker.update_dates({d: d in totals for d in dates})
+        for d in dates:
+            self.patch_rev(d, totals[d][1] if d in totals else None)
+
+    def patch_rev(self, d, rev):
+        """Одна строка «Выручки по дням» (даты по убыванию); rev=None — продаж за дату не осталось."""
+        pos = self.rev_table.rowCount()
+        for r in range(self.rev_table.rowCount()):
+            rd = self.rev_table.item(r, 0).text()
+            if rd == d:
+                if rev is None:
+                    self.rev_table.removeRow(r)
+                else:
+                    self.rev_table.setItem(r, 1, QTableWidgetItem(str(rev)))
+                return
+            if rd < d:
+                pos = r
+                break
+        if rev is not None:
+            self.rev_table.insertRow(pos)
+            self.rev_table.setItem(pos, 0, QTableWidgetItem(d))
+            self.rev_table.setItem(pos, 1, QTableWidgetItem(str(rev)))
+
     def on_prod_change(self):
         if self.prod_box.count() == 0: return
         p = self.db.get_product(self.prod_box.currentData())
@@ -182,18 +250,19 @@ class SalesTab(QWidget):
         try: self.sum_lbl.setText(f"{(self.qty_spin.value() * float(self.price_edit.text() or 0)):.2f}")
         except: pass
 
-    def on_select(self, r, c, pr, pc):
+    def on_select(self, current, previous):
+        r = current.row()
         if r < 0: return
         try:
-            pid = int(self.table.item(r, 10).text())
+            pid = int(self.model.value(r, 10))
             idx = self.prod_box.findData(pid)
             if idx >= 0: self.prod_box.setCurrentIndex(idx)
             
-            self.qty_spin.setValue(int(float(self.table.item(r, 4).text())))
-            self.price_edit.setText(self.table.item(r, 3).text())
-            self.pay_box.setCurrentText(self.table.item(r, 7).text())
-            self.emp_edit.setText(self.table.item(r, 8).text())
-            self.comm_edit.setText(self.table.item(r, 9).text())
+            self.qty_spin.setValue(int(float(self.model.value(r, 4))))
+            self.price_edit.setText(self.model.value(r, 3))
+            self.pay_box.setCurrentText(self.model.value(r, 7))
+            self.emp_edit.setText(self.model.value(r, 8))
+            self.comm_edit.setText(self.model.value(r, 9))
         except: pass
 
     def get_data(self):
@@ -201,45 +270,57 @@ class SalesTab(QWidget):
                 float(self.price_edit.text() or 0), float(self.sum_lbl.text()),
                 self.pay_box.currentText(), self.emp_edit.text(), self.comm_edit.text())
 
+    def after_write(self):
+        if self.current_user.role != "admin":
+            self.emp_edit.setText(self.current_user.full_name)
+        if self.notifier.enabled:
+            self.notifier.notify()
+        else:
+            self.refresh()
+
     def add(self):
         d = self.get_data()
         self.db.add_stock_move(d[0], d[1], d[2], "продажа", d[3], d[4], employee=d[6], comment=d[7], payment_type=d[5], user_id=self.current_user.id)
         self.db.consume_ingredients_for_sale(d[0], d[1], d[2], self.current_user.id)
-        self.refresh()
+        self.after_write()
 
     def update(self):
-        r = self.table.currentRow()
+        r = self.table.currentIndex().row()
         if r < 0: return
-        mid = int(self.table.item(r, 0).text())
+        mid = int(self.model.value(r, 0))
         d = self.get_data()
         self.db.update_sales_move(mid, d[0], d[1], d[2], d[3], d[4], d[5], d[6], d[7], self.current_user.id)
-        self.refresh()
+        self.after_write()
 
     def delete(self):
-        r = self.table.currentRow()
+        r = self.table.currentIndex().row()
         if r < 0: return
-        mid = int(self.table.item(r, 0).text())
+        mid = int(self.model.value(r, 0))
         if QMessageBox.question(self, "?", "Удалить?", QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
             self.db.delete_move(mid, self.current_user.id)
-            self.refresh()
+            self.after_write()
 
     def mark_dates(self):
-        fmt = QTextCharFormat(); fmt.setBackground(QBrush(QColor("#fff2a8")))
-        for d in self.db.fetch_dates_with_sales():
-            self.date_edit.calendarWidget().setDateTextFormat(QDate.fromString(d, "yyyy-MM-dd"), fmt)
+        self.sales_marker.reset()
 
     def export(self):
         d = self.date_edit.date()
         if self.range_check.isChecked():
-            html = self.db.build_sales_report_range_html(d, self.date_end_edit.date())
+            d1, d2 = d.toString("yyyy-MM-dd"), self.date_end_edit.date().toString("yyyy-MM-dd")
+            d_end = self.date_end_edit.date()
+            build = lambda db: db.build_sales_report_range_html(d, d_end)
+            cache = ("sales_range", None, d1, d2)
             folder = os.path.join("reports", "продажи_диапазон", d.toString("yyyy-MM"))
-            os.makedirs(folder, exist_ok=True)
             fn = os.path.join(folder, f"продажи_{d.toString('yyyyMMdd')}_{self.date_end_edit.date().toString('yyyyMMdd')}.html")
         else:
-            html = self.db.build_daily_report_html(d)
+            build = lambda db: db.build_daily_report_html(d)
+            cache = ("daily", None, d.toString("yyyy-MM-dd"), d.toString("yyyy-MM-dd"))
             folder = os.path.join("reports", "дневные_отчёты", d.toString("yyyy-MM"))
-            os.makedirs(folder, exist_ok=True)
             fn = os.path.join(folder, f"отчёт_{d.toString('yyyyMMdd')}.html")
             
-        with open(fn, "w", encoding="utf-8") as f: f.write(html)
-        webbrowser.open(os.path.abspath(fn))
\ No newline at end of file
+        # Формирование в фоне (или готовый файл из кэша), браузер откроется по готовности
+        get_report_queue().submit(self.db, build, fn, on_done=self._on_export_done, cache=cache)
+
+    def _on_export_done(self, ok, path, err):
+        if not ok:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сформировать отчет:\n{err}")
\ No newline at end of file